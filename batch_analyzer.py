@@ -0,0 +1,211 @@
+"""
+Batch Playlist Analyzer
+Offline bulk analysis of archived M3U8 files across a process pool
+
+Walks a directory or tarball of playlists, parses them in chunks on a process
+pool with the same M3U8Processor parsing logic the application uses (no
+network access), and streams one result row per playlist to JSONL or CSV.
+
+Usage:
+    python batch_analyzer.py archive/ -o results.jsonl
+    python batch_analyzer.py captures.tar.gz --format csv --workers 8 -o results.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tarfile
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+PLAYLIST_EXTENSIONS = ('.m3u8', '.m3u')
+
+CSV_FIELDS = [
+    'name', 'valid', 'type', 'is_live', 'container', 'duration', 'segment_count',
+    'target_duration', 'variant_count', 'variants', 'codecs', 'error'
+]
+
+# One M3U8Processor per worker process, created by _init_worker
+_processor = None
+
+
+def _init_worker():
+    global _processor
+    from m3u8_processor import M3U8Processor
+    _processor = M3U8Processor()
+
+
+def analyze_content(processor, name, content):
+    """
+    Analyze one playlist's text with the processor's parsing logic
+    """
+    row = {'name': name, 'valid': processor.is_valid_m3u8(content)}
+    if not row['valid']:
+        return row
+
+    if processor.is_master_playlist(content):
+        result = processor.process_master_playlist(content, name)
+        row.update({
+            'type': 'master',
+            # Liveness is a property of the media playlists, which are not fetched here
+            'is_live': None,
+            'variant_count': len(result['variants']),
+            'variants': [f"{variant['quality'] or '?'}@{variant['bandwidth'] or '?'}"
+                         for variant in result['variants']],
+            'codecs': sorted({variant['codecs'] for variant in result['variants'] if variant['codecs']})
+        })
+    else:
+        result = processor.process_media_playlist(content, name)
+        row.update({
+            'type': 'media',
+            'is_live': result['is_live'],
+            'container': result['container'],
+            'duration': round(result['duration'], 3),
+            'segment_count': result['segment_count'],
+            'target_duration': result['target_duration']
+        })
+    return row
+
+
+def _analyze_chunk(items):
+    """
+    Worker entry point: items are file paths or (name, content) pairs
+    """
+    rows = []
+    for item in items:
+        if isinstance(item, str):
+            name = item
+            try:
+                with open(item, 'r', encoding='utf-8', errors='replace') as f:
+                    content = f.read()
+            except OSError as e:
+                rows.append({'name': name, 'valid': False, 'error': str(e)})
+                continue
+        else:
+            name, content = item
+        try:
+            rows.append(analyze_content(_processor, name, content))
+        except Exception as e:
+            rows.append({'name': name, 'valid': False, 'error': str(e)})
+    return rows
+
+
+def iter_playlists(source):
+    """
+    Yield playlist file paths from a directory, or (name, content) pairs from a tarball
+    Raises ValueError when source is neither, or the archive is unreadable
+    """
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for filename in sorted(files):
+                if filename.lower().endswith(PLAYLIST_EXTENSIONS):
+                    yield os.path.join(root, filename)
+        return
+
+    # Stream mode: members are read in archive order without seeking
+    try:
+        with tarfile.open(source, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(PLAYLIST_EXTENSIONS):
+                    data = archive.extractfile(member).read()
+                    yield member.name, data.decode('utf-8', errors='replace')
+    except (tarfile.TarError, OSError) as e:
+        raise ValueError(f"{source} is not a directory or a readable tar archive: {e}") from e
+
+
+def iter_chunks(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class RowWriter:
+    """
+    Streams result rows to JSONL or CSV
+    """
+
+    def __init__(self, out, output_format):
+        self.out = out
+        self.output_format = output_format
+        self.count = 0
+        if output_format == 'csv':
+            self.csv_writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            self.csv_writer.writeheader()
+
+    def write(self, row):
+        if self.output_format == 'csv':
+            flat = dict(row)
+            for key in ('variants', 'codecs'):
+                if key in flat:
+                    flat[key] = ';'.join(flat[key])
+            self.csv_writer.writerow(flat)
+        else:
+            self.out.write(json.dumps(row) + '\n')
+        self.count += 1
+
+
+def run_batch(source, out, output_format='jsonl', workers=None, chunk_size=64):
+    """
+    Analyze every playlist under source, writing rows to out as chunks finish
+    At most two chunks per worker are in flight, so memory stays bounded
+
+    Returns:
+        Number of playlists analyzed
+    """
+    workers = workers or os.cpu_count() or 1
+    writer = RowWriter(out, output_format)
+    in_flight = set()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        for chunk in iter_chunks(iter_playlists(source), chunk_size):
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for row in future.result():
+                        writer.write(row)
+            in_flight.add(executor.submit(_analyze_chunk, chunk))
+
+        for future in in_flight:
+            for row in future.result():
+                writer.write(row)
+
+    return writer.count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze archived M3U8 playlists in bulk")
+    parser.add_argument('source', help="Directory or tarball of .m3u8 files")
+    parser.add_argument('-o', '--output', help="Output file (default: stdout)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="Output format (default: from extension, else jsonl)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=64, help="Playlists per worker task")
+    args = parser.parse_args(argv)
+
+    output_format = args.format or ('csv' if args.output and args.output.endswith('.csv') else 'jsonl')
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+
+    started = time.monotonic()
+    try:
+        count = run_batch(args.source, out, output_format, args.workers, args.chunk_size)
+    except ValueError as e:
+        print(f"❌ BatchAnalyzer: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.output:
+            out.close()
+
+    elapsed = time.monotonic() - started
+    print(f"✅ BatchAnalyzer: Analyzed {count} playlists in {elapsed:.1f}s "
+          f"({count / elapsed if elapsed else 0:.0f}/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Download Scheduler
+Shares one connection budget between all download jobs
+
+Every segment request from every job goes through a single scheduler that
+enforces a global concurrency limit and a per-host connection cap. Jobs are
+grouped into priority classes (live before VOD before backfill); within a
+class, stride scheduling hands out connections in proportion to each job's
+weight. A job that has waited longer than starvation_timeout is served next
+regardless of its class, so backfill keeps moving under a steady live load.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from urllib.parse import urlparse
+
+# Priority classes, lower value runs first
+PRIORITY_LIVE = 0
+PRIORITY_VOD = 1
+PRIORITY_BACKFILL = 2
+
+
+class ScheduledJob:
+    """
+    Bookkeeping for one download job registered with the scheduler
+    """
+
+    def __init__(self, job_id, priority, weight, pass_value):
+        self.job_id = job_id
+        self.priority = priority
+        self.weight = max(weight, 0.01)
+        self.pass_value = pass_value  # Stride scheduling virtual time
+        self.pending = deque()  # (host, future, fn, args, kwargs)
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.paused = False
+        self.finished = False  # Unregister once the last active request completes
+        self.last_dispatch = time.monotonic()
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'priority': self.priority,
+            'weight': self.weight,
+            'pending': len(self.pending),
+            'active': self.active,
+            'completed': self.completed,
+            'failed': self.failed,
+            'paused': self.paused,
+        }
+
+
+class DownloadScheduler:
+    """
+    Central scheduler for segment downloads across all jobs
+    """
+
+    def __init__(self, max_connections=16, per_host_connections=4, starvation_timeout=30.0):
+        self.max_connections = max_connections
+        self.per_host_connections = per_host_connections
+        self.starvation_timeout = starvation_timeout
+
+        self.jobs = {}
+        self.host_active = {}
+        self.paused = False
+
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._workers = []
+        for i in range(max_connections):
+            worker = threading.Thread(target=self._worker_loop, name=f"download-scheduler-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def add_job(self, job_id, priority=PRIORITY_VOD, weight=1.0):
+        """
+        Register a job; returns the existing job if job_id is already known
+        """
+        with self._condition:
+            if job_id in self.jobs:
+                return self.jobs[job_id]
+            # Start at the class's current virtual time so new jobs don't get a burst
+            job = ScheduledJob(job_id, priority, weight, self._class_pass(priority))
+            self.jobs[job_id] = job
+            return job
+
+    def submit(self, job_id, url, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) as a request to url on behalf of job_id
+        Returns a concurrent.futures.Future for the call's result
+        """
+        future = Future()
+        host = urlparse(url).netloc.lower()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("DownloadScheduler has been shut down")
+            job = self.jobs.get(job_id) or self.add_job(job_id)
+            job.finished = False
+            if not job.pending and not job.active:
+                # Idle job rejoining: no credit for the time it had nothing queued
+                job.pass_value = max(job.pass_value, self._class_pass(job.priority))
+                job.last_dispatch = time.monotonic()
+            job.pending.append((host, future, fn, args, kwargs))
+            self._condition.notify()
+        return future
+
+    def pause_job(self, job_id):
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.paused = True
+
+    def resume_job(self, job_id):
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.paused = False
+            job.last_dispatch = time.monotonic()
+            self._condition.notify_all()
+
+    def pause(self):
+        """
+        Stop dispatching new requests for all jobs (in-flight requests finish)
+        """
+        with self._condition:
+            self.paused = True
+
+    def resume(self):
+        with self._condition:
+            self.paused = False
+            now = time.monotonic()
+            for job in self.jobs.values():
+                job.last_dispatch = now
+            self._condition.notify_all()
+
+    def cancel_job(self, job_id):
+        """
+        Cancel every queued request of a job and unregister it
+        """
+        with self._condition:
+            job = self.jobs.pop(job_id, None)
+            if job is None:
+                return
+            while job.pending:
+                job.pending.popleft()[1].cancel()
+
+    def finish_job(self, job_id):
+        """
+        Unregister a job that has submitted all of its requests
+        The job is dropped as soon as nothing of it is queued or running, so
+        finished jobs don't accumulate in the selection loop and stats()
+        """
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.finished = True
+            if not job.pending and not job.active:
+                del self.jobs[job_id]
+
+    def set_priority(self, job_id, priority=None, weight=None):
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            if priority is not None:
+                job.priority = priority
+            if weight is not None:
+                job.weight = max(weight, 0.01)
+
+    def stats(self):
+        """
+        Snapshot of scheduler state for display
+        """
+        with self._condition:
+            return {
+                'paused': self.paused,
+                'active': sum(self.host_active.values()),
+                'hosts': dict(self.host_active),
+                'jobs': [job.to_dict() for job in self.jobs.values()],
+            }
+
+    def shutdown(self, wait=True):
+        """
+        Stop the workers; queued requests are cancelled
+        """
+        with self._condition:
+            self._shutdown = True
+            for job in self.jobs.values():
+                while job.pending:
+                    job.pending.popleft()[1].cancel()
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _class_pass(self, priority):
+        """
+        Lowest virtual time among busy jobs of a priority class
+        """
+        passes = [job.pass_value for job in self.jobs.values()
+                  if job.priority == priority and (job.pending or job.active)]
+        return min(passes) if passes else 0.0
+
+    def _select_job(self):
+        """
+        Pick the job whose head request should run next, or None
+        Must be called with the condition held
+        """
+        if self.paused:
+            return None
+
+        now = time.monotonic()
+        best = None
+        best_rank = None
+        for job in self.jobs.values():
+            if job.paused or not job.pending:
+                continue
+            host = job.pending[0][0]
+            if self.host_active.get(host, 0) >= self.per_host_connections:
+                continue
+            starving = now - job.last_dispatch > self.starvation_timeout
+            rank = (not starving, job.priority, job.pass_value)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = job, rank
+        return best
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                job = self._select_job()
+                while job is None and not self._shutdown:
+                    # Wake periodically so starvation aging is re-evaluated
+                    self._condition.wait(timeout=1.0)
+                    job = self._select_job()
+                if self._shutdown:
+                    return
+
+                host, future, fn, args, kwargs = job.pending.popleft()
+                job.active += 1
+                job.pass_value += 1.0 / job.weight
+                job.last_dispatch = time.monotonic()
+                self.host_active[host] = self.host_active.get(host, 0) + 1
+
+            succeeded = False
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                    succeeded = True
+                except BaseException as e:
+                    future.set_exception(e)
+
+            with self._condition:
+                job.active -= 1
+                if succeeded:
+                    job.completed += 1
+                else:
+                    job.failed += 1
+                self.host_active[host] -= 1
+                if not self.host_active[host]:
+                    del self.host_active[host]
+                if job.finished and not job.pending and not job.active and self.jobs.get(job.job_id) is job:
+                    del self.jobs[job.job_id]
+                self._condition.notify_all()
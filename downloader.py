@@ -4,9 +4,69 @@ Handles downloading M3U8 streams and segments
 """
 
 import os
+import re
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
+from urllib.parse import urlparse
 from PySide6.QtCore import QObject, Signal, QThread
+from m3u8_processor import M3U8Processor
+from download_scheduler import DownloadScheduler, PRIORITY_LIVE
+from playlist_parser import PlaylistParser
+from segment_table import SegmentTable
+from segment_verifier import SegmentVerifier, SegmentVerificationError
+
+# Failures worth an immediate re-fetch of the same segment
+RETRYABLE_ERRORS = (
+    SegmentVerificationError,
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+# 5xx answers are re-fetched after a backoff instead: this many seconds,
+# doubled per attempt, or the server's Retry-After up to MAX_RETRY_AFTER
+SERVER_ERROR_BACKOFF = 0.5
+MAX_RETRY_AFTER = 30.0
+
+# [HH:]MM:SS.mmm cue timestamp of a WebVTT timing line
+VTT_TIMESTAMP = re.compile(r'(?:(\d+):)?(\d{2}):(\d{2})\.(\d{3})')
+
+
+def is_retryable(error):
+    """
+    True for transfer failures and transient (5xx) server errors
+    """
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def retry_delay(error, attempt_number):
+    """
+    Seconds to wait before re-fetching after a retryable error
+    """
+    if not isinstance(error, requests.HTTPError):
+        return 0.0
+    retry_after = error.response.headers.get('Retry-After', '').strip()
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), MAX_RETRY_AFTER)
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(retry_after)
+                return min(max((when - datetime.now(timezone.utc)).total_seconds(), 0.0), MAX_RETRY_AFTER)
+            except (TypeError, ValueError):
+                pass
+    return SERVER_ERROR_BACKOFF * 2 ** attempt_number
 
 class M3U8Downloader(QObject):
     """
@@ -19,30 +79,920 @@ class M3U8Downloader(QObject):
     download_completed = Signal(str)  # output_file_path
     download_failed = Signal(str)  # error_message
     
-    def __init__(self):
+    def __init__(self, cache=None, max_workers=4, max_retries=2):
         super().__init__()
+        self.cache = cache  # Optional SegmentCache shared between jobs
+        self.max_workers = max_workers
+        self.max_retries = max_retries  # Immediate re-fetches per failed segment
+        self.processor = M3U8Processor()
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        })
         
-    def download_stream(self, stream_info, output_path):
+    def download_stream(self, stream_info, output_path, temp_dir=None, start=None, end=None,
+                        audio_language=None, subtitle_languages=None, scheduler=None, job_id=None):
         """
         Download M3U8 stream
-        TODO: Implement stream downloading
+        fMP4/CMAF playlists (#EXT-X-MAP) are assembled natively in one streaming
+        pass; MPEG-TS playlists are downloaded as segments and combined with FFmpeg.
+        Master playlists whose variant uses separate audio/subtitle renditions
+        (#EXT-X-MEDIA) download all selected renditions in parallel and mux them
         
         Args:
-            stream_info: Dictionary with stream information
+            stream_info: Processor result, or any stream dict with the playlist 'url'
             output_path: Path where to save the final video
+            temp_dir: Parent directory for the TS segment work directory
+                      (default: <output_path>.segments); only the directory
+                      created inside it is removed afterwards
+            start: Clip start, in seconds from the start of the playlist or as a
+                   datetime (needs #EXT-X-PROGRAM-DATE-TIME); None for the beginning
+            end: Clip end, same forms as start; None for the end of the stream
+            audio_language: Preferred audio rendition language (e.g. 'en')
+            subtitle_languages: Subtitle languages to include (default: all)
+            scheduler: Shared DownloadScheduler to queue segment requests on
+                       under job_id, instead of a private thread pool
+            job_id: Scheduler job of this download
+            
+        Only the segments covering [start, end) are fetched. Segments are not
+        cut, so the output starts and ends on segment boundaries.
+            
+        Returns:
+            List of written output files, or None on failure
+        """
+        self.download_started.emit(stream_info['url'])
+        try:
+            master = None
+            if stream_info.get('segments') is None and stream_info.get('type') != 'master_playlist':
+                # Load once here so a master playlist's renditions can be inspected
+                master = self.processor.process_playlist(stream_info['url'])
+                if master is None:
+                    raise ValueError("Could not load the playlist")
+                if master['type'] != 'master_playlist':
+                    stream_info, master = master, None
+            elif stream_info.get('type') == 'master_playlist':
+                master = stream_info
+                
+            if master is not None:
+                variant = self.select_variant(master)
+                if variant is None:
+                    raise ValueError("Master playlist has no variants")
+                renditions = self.select_renditions(master, variant, audio_language, subtitle_languages)
+                if renditions:
+                    outputs = self.download_renditions(variant, renditions, output_path, temp_dir, start, end,
+                                                       scheduler, job_id)
+                    if outputs is None:
+                        return None
+                    print(f"✅ M3U8Downloader: Saved {stream_info['url']} to {', '.join(outputs)}")
+                    self.download_completed.emit(outputs[0])
+                    return outputs
+                stream_info = variant
+                
+            segments = self._clipped_segments(stream_info, start, end)
+                
+            if segments.is_fmp4:
+                outputs = self.assemble_fmp4(segments, output_path, scheduler, job_id)
+            else:
+                work_dir = self._make_work_dir(temp_dir, f"{output_path}.segments")
+                segment_files = self.download_segments(segments, work_dir, scheduler=scheduler, job_id=job_id)
+                if segment_files is None or not self.combine_segments(segment_files, output_path):
+                    return None
+                shutil.rmtree(work_dir, ignore_errors=True)
+                outputs = [output_path]
+                
+        except Exception as e:
+            error_msg = f"Failed to download stream: {str(e)}"
+            print(f"❌ M3U8Downloader: {error_msg}")
+            self.download_failed.emit(error_msg)
+            return None
+            
+        print(f"✅ M3U8Downloader: Saved {stream_info['url']} to {', '.join(outputs)}")
+        self.download_completed.emit(outputs[0])
+        return outputs
+        
+    def _make_work_dir(self, parent, default):
+        """
+        Create a fresh working directory this downloader owns and may delete
+        A caller-supplied parent only gets a new subdirectory; the parent
+        itself is never removed
+        """
+        if parent is None:
+            os.makedirs(default, exist_ok=True)
+            return default
+        os.makedirs(parent, exist_ok=True)
+        return tempfile.mkdtemp(prefix=f"{os.path.basename(default)}-", dir=parent)
+        
+    def resolve_segments(self, stream_info):
+        """
+        SegmentTable for a stream, fetching the playlist when it isn't parsed yet
+        Master playlists resolve to their highest-bandwidth variant
+        """
+        if stream_info.get('segments') is not None:
+            return stream_info['segments']
+            
+        if stream_info.get('type') == 'master_playlist':
+            result = stream_info
+        else:
+            result = self.processor.process_playlist(stream_info['url'])
+        if result and result['type'] == 'master_playlist':
+            best = self.select_variant(result)
+            if best is None:
+                return None
+            result = self.processor.process_playlist(best['url'])
+        return result['segments'] if result else None
+        
+    def _clipped_segments(self, stream_info, start=None, end=None):
+        """
+        Resolve a stream's segments and clip them to [start, end)
+        Raises ValueError for unloadable, empty or encrypted selections
+        """
+        return self._clip_span(stream_info, start, end)[0]
+        
+    def _clip_span(self, stream_info, start=None, end=None):
+        """
+        Like _clipped_segments, but returns (segments, clip_start, clip_end):
+        the playlist times the clipped segments actually cover once the bounds
+        have snapped out to segment boundaries (None where the side is open)
+        """
+        segments = self.resolve_segments(stream_info)
+        if segments is None:
+            raise ValueError(f"Could not load the media playlist {stream_info['url']}")
+        if not len(segments):
+            raise ValueError(f"The media playlist {stream_info['url']} has no segments")
+        clip_start = clip_end = None
+        if start is not None or end is not None:
+            total = len(segments)
+            first, stop = segments.covering_range(segments.playlist_time(start), segments.playlist_time(end))
+            if first == stop:
+                raise ValueError("The requested time range is outside the stream")
+            if start is not None:
+                clip_start = segments.start_time(first)
+            if end is not None:
+                clip_end = segments.start_time(stop)
+            segments = segments.subset(first, stop)
+            print(f"✂️ M3U8Downloader: Clipped to {len(segments)} of {total} segments "
+                  f"({segments.total_duration:.1f}s)")
+        if any(flags & SegmentTable.FLAG_ENCRYPTED for flags in segments.flags):
+            raise ValueError("Encrypted streams are not supported")
+        return segments, clip_start, clip_end
+        
+    def select_variant(self, master_result):
+        """
+        Highest-bandwidth variant of a master playlist, or None
+        """
+        if not master_result['variants']:
+            return None
+        return max(master_result['variants'], key=lambda variant: int(variant.get('bandwidth') or 0))
+        
+    def select_renditions(self, master_result, variant, audio_language=None, subtitle_languages=None):
+        """
+        Alternate renditions (#EXT-X-MEDIA) to download alongside a variant
+        
+        One audio rendition is picked from the variant's AUDIO group: the
+        preferred language if given, else the DEFAULT one, else the first.
+        Every rendition of its SUBTITLES group is included, optionally
+        filtered by language. Renditions without a URI are carried inside the
+        variant stream itself and need no separate download.
+        """
+        renditions = master_result.get('renditions', [])
+        
+        chosen = []
+        audio = [rendition for rendition in renditions
+                 if rendition['type'] == 'AUDIO' and rendition['group_id'] == variant.get('audio_group')]
+        if audio:
+            preferred = [rendition for rendition in audio
+                         if audio_language and self._language_matches(rendition['language'], audio_language)]
+            pick = (preferred or [rendition for rendition in audio if rendition['default']] or audio)[0]
+            if pick['url']:
+                chosen.append(pick)
+                
+        for rendition in renditions:
+            if (rendition['type'] == 'SUBTITLES' and rendition['url']
+                    and rendition['group_id'] == variant.get('subtitle_group')
+                    and (subtitle_languages is None
+                         or any(self._language_matches(rendition['language'], language)
+                                for language in subtitle_languages))):
+                chosen.append(rendition)
+        return chosen
+        
+    def _language_matches(self, language, wanted):
+        """
+        Compare language tags by primary subtag ('en' matches 'en-US')
+        """
+        return bool(language) and language.lower().split('-')[0] == wanted.lower().split('-')[0]
+        
+    def download_renditions(self, variant, renditions, output_path, temp_dir=None, start=None, end=None,
+                            scheduler=None, job_id=None):
+        """
+        Download a variant and its alternate renditions in parallel, then mux
+        (see fetch_renditions for the download and clipping)
+        
+        Args:
+            temp_dir: Parent directory for the rendition work directory
+                      (default: <output_path>.renditions); only the directory
+                      created inside it is removed afterwards
+            scheduler: Shared DownloadScheduler, as for fetch_renditions
+            job_id: Scheduler job of this download (default: output_path)
+            
+        Returns:
+            List with the muxed output file, or None when a rendition failed to
+            download (already reported through download_failed)
+        """
+        work_dir = self._make_work_dir(temp_dir, f"{output_path}.renditions")
+        tracks = self.fetch_renditions(variant, renditions, work_dir, start, end, scheduler,
+                                       job_id or output_path)
+        if tracks is None:
+            return None
+            
+        print(f"🎬 M3U8Downloader: Muxing {len(tracks)} renditions "
+              f"({', '.join(track['kind'] for track in tracks)})")
+        self.mux_renditions(tracks, output_path, work_dir, time_offset=tracks[0]['start'])
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return [output_path]
+        
+    def fetch_renditions(self, variant, renditions, work_dir, start=None, end=None, scheduler=None, job_id=None):
+        """
+        Download a variant and its alternate renditions in parallel into work_dir
+        
+        All renditions share one DownloadScheduler, so together they never use
+        more connections than a single stream would, and connections freed by
+        a finished rendition go to the others. Wall time is therefore about
+        that of the largest rendition, not the sum.
+        
+        A [start, end) clip is applied to the video first; audio and subtitle
+        renditions are clipped to the span its segments actually cover. Their
+        own segment grids may snap that span out further, so each rendition's
+        actual start is kept for mux_renditions to offset against the video's.
+        
+        Args:
+            scheduler: Shared DownloadScheduler; each rendition becomes a job
+                       <job_id>:<n>_<kind> with job_id's priority and an equal
+                       share of its weight. Without one, a private scheduler
+                       sized to max_workers is used
+            job_id: Scheduler job of this download (default: work_dir)
+            
+        Returns:
+            Track dicts for mux_renditions (video first), or None when a
+            rendition failed to download (already reported through download_failed)
+        """
+        tracks = [{'kind': 'video', 'info': variant, 'language': ''}]
+        tracks += [{'kind': rendition['type'].lower(), 'info': rendition, 'language': rendition['language']}
+                   for rendition in renditions]
+        
+        # The video is clipped first; the other renditions are clipped to the
+        # range its whole segments cover
+        video_span = self._clip_span(variant, start, end)
+        clip_start, clip_end = video_span[1:]
+        with ThreadPoolExecutor(max_workers=len(tracks)) as executor:
+            spans = [video_span] + list(executor.map(
+                lambda track: self._clip_span(track['info'], clip_start, clip_end), tracks[1:]))
+        for track, (segments, track_start, _) in zip(tracks, spans):
+            track['segments'] = segments
+            track['start'] = track_start or 0.0
+            
+        progress_lock = threading.Lock()
+        done = [0] * len(tracks)
+        grand_total = sum(len(track['segments']) for track in tracks)
+        
+        def track_progress(number):
+            def on_progress(completed, total):
+                with progress_lock:
+                    done[number] = completed
+                    percentage = int(sum(done) * 100 / grand_total)
+                self.progress_updated.emit(percentage)
+            return on_progress
+            
+        private_scheduler = scheduler is None
+        if private_scheduler:
+            scheduler = DownloadScheduler(max_connections=self.max_workers, per_host_connections=self.max_workers)
+        job_id = job_id or work_dir
+        parent = scheduler.add_job(job_id)
+        for number, track in enumerate(tracks):
+            track['job_id'] = f"{job_id}:{number}_{track['kind']}"
+            scheduler.add_job(track['job_id'], parent.priority, parent.weight / len(tracks))
+        try:
+            with ThreadPoolExecutor(max_workers=len(tracks)) as executor:
+                futures = [executor.submit(self.download_segments, track['segments'],
+                                           os.path.join(work_dir, f"{number}_{track['kind']}"),
+                                           scheduler=scheduler, job_id=track['job_id'],
+                                           on_progress=track_progress(number))
+                           for number, track in enumerate(tracks)]
+                for track, future in zip(tracks, futures):
+                    track['files'] = future.result()
+        finally:
+            if private_scheduler:
+                scheduler.shutdown()
+            else:
+                # Finished renditions are already unregistered; drop the rest
+                for track in tracks:
+                    scheduler.cancel_job(track['job_id'])
+                scheduler.finish_job(job_id)
+            
+        if any(track['files'] is None for track in tracks):
+            return None
+        return tracks
+        
+    def assemble_fmp4(self, segments, output_path, scheduler=None, job_id=None):
+        """
+        Write fMP4/CMAF init and media segments straight into playable MP4 files
+        
+        Each init section is fetched once per map change. A discontinuity
+        (where timestamps usually reset) or a map change to a different init
+        section starts a new file (<name>_<n>.mp4) with its own init section,
+        so every output file has one continuous timeline. Files are written as .part and renamed into
+        place, so finalizing is a rename rather than a copy.
+        
+        Args:
+            scheduler: Shared DownloadScheduler to queue segment fetches on
+                       under job_id, instead of a private thread pool
+            job_id: Scheduler job of this download (default: output_path)
+            
+        Returns:
+            List of written output files
+        """
+        stem, ext = os.path.splitext(output_path)
+        outputs = []
+        out = None
+        current_map = None
+        current_init = None
+        total = len(segments)
+        
+        try:
+            for index, (row, data) in enumerate(self._prefetch_segments(segments, scheduler, job_id or output_path)):
+                init_map = row.init_map
+                if out is None or init_map != current_map or row.is_discontinuity:
+                    new_file = out is None or row.is_discontinuity
+                    if out is None or init_map != current_map:
+                        init_bytes = (self._fetch_cached(init_map[0], self._map_range(init_map), 'fmp4')
+                                      if init_map else b'')
+                        # A new map URI with identical bytes continues the same file
+                        new_file = new_file or init_bytes != current_init
+                        current_map, current_init = init_map, init_bytes
+                        
+                    if new_file:
+                        if out is not None:
+                            self._finalize_part_file(out, outputs[-1])
+                        path = output_path if not outputs else f"{stem}_{len(outputs)}{ext}"
+                        out = open(f"{path}.part", 'wb')
+                        outputs.append(path)
+                        out.write(current_init)
+                    
+                out.write(data)
+                self.progress_updated.emit(int((index + 1) * 100 / total))
+                
+            if out is not None:
+                self._finalize_part_file(out, outputs[-1])
+                out = None
+                
+        finally:
+            if out is not None:
+                out.close()
+                os.remove(out.name)
+                
+        return outputs
+        
+    def _prefetch_segments(self, segments, scheduler=None, job_id=None):
+        """
+        Yield (row, bytes) in playlist order while a bounded window of
+        upcoming segments is fetched concurrently, on a private thread pool
+        or on the shared scheduler under job_id
+        """
+        executor = None
+        if scheduler is None:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            submit = lambda url, *args: executor.submit(self._fetch_cached, url, *args)
+        else:
+            submit = lambda url, *args: scheduler.submit(job_id, url, self._fetch_cached, url, *args)
+            
+        window = deque()
+        completed = False
+        try:
+            for row in segments:
+                window.append((row, submit(row.uri, row.byte_range, self._container_of(row.uri, row.init_map))))
+                if len(window) >= self.max_workers * 2:
+                    row, future = window.popleft()
+                    yield row, future.result()
+            while window:
+                row, future = window.popleft()
+                yield row, future.result()
+            completed = True
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            elif completed:
+                scheduler.finish_job(job_id)
+            else:
+                scheduler.cancel_job(job_id)
+                
+    def _finalize_part_file(self, out, path):
+        out.close()
+        os.replace(out.name, path)
+        
+    def _map_range(self, init_map):
         """
-        pass
+        (offset, length) of an #EXT-X-MAP tuple, or None for the whole resource
+        """
+        uri, byte_offset, byte_length = init_map
+        return (byte_offset, byte_length) if byte_length >= 0 else None
+        
+    def _container_of(self, uri, init_map=None):
+        """
+        Container a segment must be in: 'fmp4' under an #EXT-X-MAP, 'ts' for
+        .ts URIs, or None to let the verifier sniff it (packed audio, WebVTT)
+        """
+        if init_map:
+            return 'fmp4'
+        if urlparse(uri).path.lower().endswith(('.ts', '.m2ts')):
+            return 'ts'
+        return None
+        
+    def download_live(self, playlist_url, output_path, stop_event=None, max_duration=None,
+                      scheduler=None, job_id=None):
+        """
+        Capture a live media playlist to output_path as it is published
+        
+        Low-Latency HLS servers (EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES) are
+        polled with blocking reloads (_HLS_msn/_HLS_part) and captured part by
+        part, including the part announced by EXT-X-PRELOAD-HINT, so the
+        capture trails the live edge by roughly one part. Regular live
+        playlists are polled every half target duration.
+        
+        Args:
+            playlist_url: Live media playlist URL
+            output_path: File the media is appended to
+            stop_event: threading.Event that ends the capture when set
+            max_duration: Stop after this many seconds of media
+            scheduler: Shared DownloadScheduler; segment and part fetches are
+                       queued there under job_id (registered in the live
+                       priority class unless the caller registered it already)
+            job_id: Scheduler job of this capture (default: output_path)
+            
+        Returns:
+            output_path, or None on failure
+        """
+        stop_event = stop_event or threading.Event()
+        self.download_started.emit(playlist_url)
+        
+        if scheduler is None:
+            fetch = self._fetch_bytes
+        else:
+            job_id = job_id or output_path
+            scheduler.add_job(job_id, priority=PRIORITY_LIVE)
+            fetch = lambda url, *args, **kwargs: scheduler.submit(
+                job_id, url, self._fetch_bytes, url, *args, **kwargs).result()
+        
+        next_msn = None  # Media sequence number being captured
+        next_part = 0    # Next part index of next_msn (0 = nothing of it yet)
+        captured = 0.0
+        params = None
+        written_map = None
+        
+        try:
+            with open(output_path, 'wb') as out:
+                while not stop_event.is_set():
+                    parser, segments = self._fetch_live_playlist(playlist_url, params)
+                    if parser.is_encrypted or any(segment.flags & SegmentTable.FLAG_ENCRYPTED
+                                                  for segment in segments):
+                        raise ValueError("Encrypted streams are not supported")
+                    parts_by_msn = {}
+                    for part in parser.parts:
+                        parts_by_msn.setdefault(part.sequence, []).append(part)
+                        
+                    if next_msn is None:
+                        # Start at the live edge: the in-progress segment if it has
+                        # parts, otherwise the last complete segment
+                        if parts_by_msn.get(parser.next_sequence) or not segments:
+                            next_msn = parser.next_sequence
+                        else:
+                            next_msn = segments[-1].sequence
+                            
+                    if parser.init_map and parser.init_map != written_map:
+                        # fMP4 live stream: init section precedes the media it describes
+                        out.write(fetch(parser.init_map[0], self._map_range(parser.init_map), container='fmp4'))
+                        written_map = parser.init_map
+                        
+                    # Complete segments: finish a partially captured one from its
+                    # remaining parts, fetch later ones whole
+                    for segment in segments:
+                        if segment.sequence < next_msn:
+                            continue
+                        if segment.sequence > next_msn:
+                            print(f"⚠️ M3U8Downloader: Live capture skipped to sequence {segment.sequence}")
+                            next_msn, next_part = segment.sequence, 0
+                            
+                        if next_part == 0:
+                            out.write(fetch(segment.uri, self._byte_range(segment),
+                                            container=self._container_of(segment.uri, segment.init_map)))
+                            captured += segment.duration
+                        elif next_msn not in parts_by_msn:
+                            print(f"⚠️ M3U8Downloader: Parts of sequence {next_msn} expired before they were captured")
+                        else:
+                            for part in parts_by_msn[next_msn][next_part:]:
+                                out.write(fetch(part.uri, self._byte_range(part),
+                                                container=self._container_of(part.uri, parser.init_map)))
+                                captured += part.duration
+                        next_msn, next_part = next_msn + 1, 0
+                        
+                    # Parts of the in-progress segment published since the last reload
+                    for part in parts_by_msn.get(next_msn, []):
+                        if part.index >= next_part:
+                            out.write(fetch(part.uri, self._byte_range(part),
+                                            container=self._container_of(part.uri, parser.init_map)))
+                            captured += part.duration
+                            next_part = part.index + 1
+                            
+                    hint = parser.preload_hint
+                    if (parser.can_block_reload and hint and hint['type'] == 'PART'
+                            and hint['sequence'] == next_msn and hint['index'] == next_part):
+                        # The server holds this request until the hinted part exists
+                        hint_range = (hint['byte_offset'], hint['byte_length']) if hint['byte_length'] >= 0 else None
+                        out.write(fetch(hint['uri'], hint_range, open_range_start=hint['byte_offset'],
+                                        container=self._container_of(hint['uri'], parser.init_map)))
+                        captured += parser.part_target or 0
+                        next_part += 1
+                        
+                    out.flush()
+                    self.progress_updated.emit(int(captured))
+                    
+                    if parser.has_endlist or (max_duration and captured >= max_duration):
+                        break
+                        
+                    if parser.can_block_reload:
+                        params = {'_HLS_msn': next_msn, '_HLS_part': next_part} if parser.part_target else {'_HLS_msn': next_msn}
+                    else:
+                        stop_event.wait((parser.target_duration or 6) / 2)
+                        
+        except Exception as e:
+            if scheduler is not None:
+                scheduler.cancel_job(job_id)
+            error_msg = f"Live capture failed: {str(e)}"
+            print(f"❌ M3U8Downloader: {error_msg}")
+            self.download_failed.emit(error_msg)
+            return None
+            
+        if scheduler is not None:
+            scheduler.finish_job(job_id)
+        print(f"✅ M3U8Downloader: Captured {captured:.1f}s of live media to {output_path}")
+        self.download_completed.emit(output_path)
+        return output_path
+        
+    def _fetch_live_playlist(self, playlist_url, params=None):
+        """
+        Fetch and parse a live media playlist; blocking reloads pass _HLS_* params
+        Returns (parser, list of complete segments)
+        """
+        # Blocking reloads may be held for up to three target durations
+        response = self.session.get(playlist_url, params=params, timeout=30)
+        response.raise_for_status()
+        
+        parser = PlaylistParser(playlist_url, self.processor.resolve_url)
+        segments = []
+        for line in response.text.split('\n'):
+            segment = parser.feed(line)
+            if segment:
+                segments.append(segment)
+        return parser, segments
+        
+    def _byte_range(self, item):
+        """
+        (offset, length) of a ParsedSegment/PartialSegment, or None
+        """
+        if item.byte_length >= 0:
+            return (item.byte_offset, item.byte_length)
+        return None
+        
+    def _fetch_bytes(self, url, byte_range=None, open_range_start=0, container=None):
+        """
+        Fetch and verify a whole resource or a byte range of it into memory
+        """
+        def attempt():
+            with self._open_segment(url, byte_range, open_range_start) as response:
+                return b''.join(self._verified_chunks(response, byte_range, container=container))
+                
+        return self._with_retries(url, attempt)
+        
+    def _fetch_cached(self, url, byte_range=None, container=None):
+        """
+        Like _fetch_bytes, but served from and stored into the segment cache
+        when the downloader has one
+        """
+        cache = self.cache
+        if cache is None:
+            return self._fetch_bytes(url, byte_range, container=container)
+            
+        object_path = cache.get(url, byte_range)
+        if object_path is None:
+            def attempt():
+                with self._open_segment(url, byte_range) as response:
+                    return cache.store_stream(url, self._verified_chunks(response, byte_range, container=container),
+                                              byte_range)
+            object_path = self._with_retries(url, attempt)
+            
+        try:
+            with open(object_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            # Evicted (e.g. by another process) between lookup and read
+            return self._fetch_bytes(url, byte_range, container=container)
+            
+    def _open_segment(self, url, byte_range=None, open_range_start=0):
+        """
+        Start a streaming GET for a segment, with a Range header when needed
+        """
+        headers = {}
+        if byte_range:
+            offset, length = byte_range
+            headers['Range'] = f"bytes={offset}-{offset + length - 1}"
+        elif open_range_start:
+            headers['Range'] = f"bytes={open_range_start}-"
+        response = self.session.get(url, headers=headers, timeout=30, stream=True)
+        response.raise_for_status()
+        return response
+        
+    def _verified_chunks(self, response, byte_range=None, checksum=None, container=None):
+        """
+        Yield the response body in chunks while a SegmentVerifier checks them
+        against the expected container (sniffed when None)
+        Raises SegmentVerificationError mid-stream or after the last chunk
+        """
+        if byte_range and response.status_code != 206:
+            raise SegmentVerificationError("Server ignored the byte range request")
+            
+        expected_length = None
+        content_length = response.headers.get('content-length')
+        if content_length and not response.headers.get('content-encoding'):
+            expected_length = int(content_length)
+            
+        verifier = SegmentVerifier(expected_length=expected_length, checksum=checksum, container=container)
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            verifier.feed(chunk)
+            yield chunk
+        verifier.finish()
         
-    def download_segments(self, segment_urls, temp_dir):
+    def _with_retries(self, url, attempt):
+        """
+        Run attempt(), re-fetching immediately when a segment fails verification
+        or the transfer breaks off, and after a backoff (or the server's
+        Retry-After) when it answers with a 5xx
         """
-        Download individual segments
-        TODO: Implement segment downloading
+        for attempt_number in range(self.max_retries + 1):
+            try:
+                return attempt()
+            except (requests.RequestException, SegmentVerificationError) as e:
+                if attempt_number == self.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_delay(e, attempt_number)
+                print(f"⚠️ M3U8Downloader: Re-fetching {url}"
+                      f"{f' in {delay:.1f}s' if delay else ''} ({e})")
+                time.sleep(delay)
+                
+    def download_segments(self, segment_urls, temp_dir, cache=None, scheduler=None, job_id=None,
+                          checksums=None, on_progress=None):
+        """
+        Download individual segments into temp_dir
+        Segments already in the segment cache are served from local disk;
+        others are verified as they stream in and re-fetched if corrupt
+        
+        Args:
+            segment_urls: Segment URLs, or SegmentRow/ParsedSegment objects
+                          (which may carry a byte range)
+            temp_dir: Directory for the downloaded segment files
+            cache: SegmentCache to use instead of the downloader's own
+            scheduler: Shared DownloadScheduler; requests are queued there under
+                       job_id instead of running on a private thread pool
+            job_id: Scheduler job these segments belong to
+            checksums: Optional {segment url: 'sha256:<hex>'} to verify against
+            on_progress: Called with (completed, total) instead of emitting
+                         progress_updated, for callers aggregating several jobs
+            
+        Returns:
+            List of segment file paths in playlist order, or None on failure
         """
-        pass
+        cache = cache if cache is not None else self.cache
+        requests_list = [self._segment_request(item) for item in segment_urls]
+        os.makedirs(temp_dir, exist_ok=True)
+        
+        total = len(requests_list)
+        completed = 0
+        segment_files = [None] * total
+        
+        executor = None
+        if scheduler is None:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            submit = lambda url, *args: executor.submit(self._download_segment, url, *args)
+        else:
+            job_id = job_id or temp_dir
+            submit = lambda url, *args: scheduler.submit(job_id, url, self._download_segment, url, *args)
+            
+        try:
+            futures = {
+                submit(url, byte_range, os.path.join(temp_dir, f"segment_{index:06d}.ts"), cache,
+                       (checksums or {}).get(url), container): index
+                for index, (url, byte_range, container) in enumerate(requests_list)
+            }
+            for future, index in futures.items():
+                segment_files[index] = future.result()
+                completed += 1
+                if on_progress:
+                    on_progress(completed, total)
+                else:
+                    self.progress_updated.emit(int(completed * 100 / total))
+                
+        except Exception as e:
+            if scheduler is not None:
+                scheduler.cancel_job(job_id)
+            error_msg = f"Failed to download segments: {str(e)}"
+            print(f"❌ M3U8Downloader: {error_msg}")
+            self.download_failed.emit(error_msg)
+            return None
+            
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+                
+        if scheduler is not None:
+            scheduler.finish_job(job_id)
+        if cache is not None:
+            print(f"💾 M3U8Downloader: Segment cache {cache.hits} hits, {cache.misses} misses")
+        return segment_files
+        
+    def _segment_request(self, item):
+        """
+        Normalize a segment entry into (url, byte_range, container)
+        """
+        if isinstance(item, str):
+            return item, None, self._container_of(item)
+        container = self._container_of(item.uri, getattr(item, 'init_map', None))
+        if hasattr(item, 'byte_range'):
+            return item.uri, item.byte_range, container
+        if getattr(item, 'byte_length', -1) >= 0:
+            return item.uri, (item.byte_offset, item.byte_length), container
+        return item.uri, None, container
+        
+    def _download_segment(self, url, byte_range, dest_path, cache=None, checksum=None, container=None):
+        """
+        Fetch and verify one segment to dest_path, going through the cache when given
+        Segments that fail verification are never cached
+        """
+        if cache is not None:
+            cached_path = cache.get(url, byte_range)
+            if cached_path:
+                try:
+                    return cache.copy_to(cached_path, dest_path)
+                except OSError:
+                    # Evicted (e.g. by another process) between lookup and copy
+                    pass
+                
+        def attempt():
+            with self._open_segment(url, byte_range) as response:
+                chunks = self._verified_chunks(response, byte_range, checksum, container)
+                
+                if cache is not None:
+                    object_path = cache.store_stream(url, chunks, byte_range)
+                    return cache.copy_to(object_path, dest_path)
+                    
+                try:
+                    with open(dest_path, 'wb') as f:
+                        for chunk in chunks:
+                            f.write(chunk)
+                except SegmentVerificationError:
+                    os.remove(dest_path)
+                    raise
+            return dest_path
+            
+        return self._with_retries(url, attempt)
         
     def combine_segments(self, segment_files, output_path):
         """
-        Combine segments using FFmpeg
-        TODO: Implement segment combination
+        Combine segments using FFmpeg's concat demuxer (stream copy, no re-encode)
+        
+        Returns:
+            output_path, or None on failure
+        """
+        list_path = f"{output_path}.concat.txt"
+        try:
+            self._write_concat_list(segment_files, list_path)
+            command = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                       '-i', list_path, '-c', 'copy', output_path]
+            result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip() or f"ffmpeg exited with {result.returncode}")
+                
+        except Exception as e:
+            error_msg = f"Failed to combine segments: {str(e)}"
+            print(f"❌ M3U8Downloader: {error_msg}")
+            self.download_failed.emit(error_msg)
+            return None
+            
+        finally:
+            if os.path.exists(list_path):
+                os.remove(list_path)
+                
+        return output_path
+        
+    def mux_renditions(self, tracks, output_path, work_dir, time_offset=0.0):
+        """
+        Mux downloaded renditions into output_path with a single FFmpeg pass
+        
+        MPEG-TS renditions are read straight from their segment files through
+        the concat demuxer; fMP4 renditions are stitched to one file (init
+        section + fragments) and WebVTT segments merged into one .vtt, since
+        neither can go through the concat demuxer. Streams are copied, except
+        subtitles for MP4 outputs, which must be converted to mov_text.
+        
+        Args:
+            tracks: Dicts with 'kind' (video/audio/subtitles), 'language',
+                    'segments' (SegmentTable), 'files' (segment paths) and
+                    optionally 'start', the playlist time of the first segment
+            time_offset: Playlist time the output starts at; WebVTT cue times
+                         are shifted back by it, and other renditions whose
+                         'start' differs are offset by the difference
+        """
+        command = ['ffmpeg', '-y', '-loglevel', 'error']
+        for number, track in enumerate(tracks):
+            base = os.path.join(work_dir, f"{number}_{track['kind']}")
+            if track['kind'] == 'subtitles':
+                command += ['-i', self._merge_webvtt(track['files'], f"{base}.vtt", time_offset)]
+                continue
+            # A rendition whose segment grid snapped to a different start than
+            # the video's is shifted so both play in sync
+            offset = track.get('start', time_offset) - time_offset
+            if offset:
+                command += ['-itsoffset', f"{offset:.3f}"]
+            if track['segments'].is_fmp4:
+                command += ['-i', self._stitch_fmp4(track['segments'], track['files'], f"{base}.mp4")]
+            else:
+                list_path = f"{base}.concat.txt"
+                self._write_concat_list(track['files'], list_path)
+                command += ['-f', 'concat', '-safe', '0', '-i', list_path]
+                
+        has_audio = any(track['kind'] == 'audio' for track in tracks)
+        # The variant's own audio is replaced when a separate audio rendition exists
+        command += ['-map', '0:v?' if has_audio else '0']
+        counts = {'audio': 0, 'subtitles': 0}
+        for number, track in enumerate(tracks[1:], start=1):
+            stream = 'a' if track['kind'] == 'audio' else 's'
+            command += ['-map', f"{number}:{stream}"]
+            if track['language']:
+                command += [f"-metadata:s:{stream}:{counts[track['kind']]}", f"language={track['language']}"]
+            counts[track['kind']] += 1
+            
+        command += ['-c', 'copy']
+        if counts['subtitles'] and os.path.splitext(output_path)[1].lower() in ('.mp4', '.m4v', '.mov'):
+            command += ['-c:s', 'mov_text']
+        command.append(output_path)
+        
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"ffmpeg exited with {result.returncode}")
+        return output_path
+        
+    def _stitch_fmp4(self, segments, segment_files, path):
+        """
+        Concatenate an fMP4 rendition's init sections and fragments into one file
+        """
+        current_map = None
+        with open(path, 'wb') as out:
+            for row, segment_file in zip(segments, segment_files):
+                if row.init_map != current_map:
+                    current_map = row.init_map
+                    if current_map:
+                        out.write(self._fetch_cached(current_map[0], self._map_range(current_map), 'fmp4'))
+                with open(segment_file, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+        return path
+        
+    def _merge_webvtt(self, segment_files, path, time_offset=0.0):
+        """
+        Merge WebVTT segments into one file, keeping only the first header
+        Cue times are moved back by time_offset seconds (clamped at zero)
+        """
+        def shift(match):
+            hours, minutes, seconds, millis = match.groups()
+            total = max(0.0, int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+                        + int(millis) / 1000 - time_offset)
+            hours, rest = divmod(round(total * 1000), 3600000)
+            minutes, rest = divmod(rest, 60000)
+            return f"{hours:02d}:{minutes:02d}:{rest // 1000:02d}.{rest % 1000:03d}"
+            
+        with open(path, 'w', encoding='utf-8') as out:
+            for number, segment_file in enumerate(segment_files):
+                with open(segment_file, 'r', encoding='utf-8-sig', errors='replace') as f:
+                    text = f.read().replace('\r\n', '\n')
+                if number:
+                    # Drop the WEBVTT header block (up to the first blank line)
+                    text = text.split('\n\n', 1)[1] if '\n\n' in text else ''
+                if time_offset:
+                    text = '\n'.join(VTT_TIMESTAMP.sub(shift, line) if '-->' in line else line
+                                      for line in text.split('\n'))
+                out.write(text.rstrip('\n') + '\n\n')
+        return path
+        
+    def _write_concat_list(self, segment_files, list_path):
+        """
+        Write an FFmpeg concat demuxer list of segment files
         """
-        pass
\ No newline at end of file
+        with open(list_path, 'w') as f:
+            for segment_file in segment_files:
+                escaped = os.path.abspath(segment_file).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
@@ -107,6 +107,8 @@ class MainWindow(QMainWindow):
         
         # Connect page load finished to inject JavaScript
         self.web_page.loadFinished.connect(self.on_page_load_finished)
+        # Every navigation (typed or followed link) closes the previous page's probe counters
+        self.web_page.loadStarted.connect(self.on_page_load_started)
         
         self.drawer_layout.addWidget(self.web_view)
         
@@ -159,6 +161,13 @@ class MainWindow(QMainWindow):
         # Update content area to show we're ready for detection
         self.content_area.setText("🎯 M3U8 Detection Active\n\nNavigating to: " + url + "\n\nWaiting for M3U8 streams to be detected...")
         
+    @Slot()
+    def on_page_load_started(self):
+        """
+        Handler for when a page starts loading - report the previous page's probe counters
+        """
+        self.m3u8_detector.report_probe_stats()
+        
     @Slot(bool)
     def on_page_load_finished(self, success):
         """
@@ -0,0 +1,562 @@
+"""
+Synthetic HLS Origin Server
+Local stand-in HLS server for load and fault-injection testing, fully offline
+
+Serves generated streams from a single process:
+
+    /vod/master.m3u8                 VOD master with three variants (MPEG-TS)
+    /vod/<variant>/index.m3u8        VOD media playlists
+    /alt/master.m3u8                 Master with separate audio (en, es) and subtitle renditions
+    /live/index.m3u8                 Live sliding window
+    /llhls/index.m3u8                Low-Latency HLS (parts, preload hints, blocking reload)
+    /byterange/index.m3u8            One file addressed with #EXT-X-BYTERANGE
+    /fmp4/index.m3u8                 fMP4/CMAF with #EXT-X-MAP
+    /encrypted/index.m3u8            AES-128 encrypted segments (needs 'cryptography')
+
+Media responses go through per-connection fault injection: bandwidth limit,
+latency with jitter, HTTP errors, HTML error pages served with 200, and stalls
+that send half a body and hang up. Live streams share one clock started with
+the server.
+
+Usage:
+    python hls_test_server.py --port 8080 --bandwidth 2000000 --error-rate 0.05
+"""
+
+import argparse
+import random
+import re
+import struct
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives import padding
+except ImportError:
+    Cipher = None
+
+TS_PACKET_SIZE = 188
+
+# (name, resolution, bits per second)
+VOD_VARIANTS = [
+    ('240p', '426x240', 200_000),
+    ('480p', '854x480', 400_000),
+    ('720p', '1280x720', 800_000),
+]
+STREAM_BITRATE = 400_000  # Bitrate of the single-rendition streams
+AUDIO_BITRATE = 128_000
+
+# (GROUP-ID, language, NAME) of the /alt alternate audio renditions
+ALT_AUDIO = [('aud', 'en', 'English'), ('aud', 'es', 'Español')]
+
+ENCRYPTION_KEY = bytes(range(16))
+
+PAYLOAD_CACHE_SIZE = 1024  # Generated payloads kept per server; live parts would otherwise grow forever
+
+CONTENT_TYPES = {'.ts': 'video/mp2t', '.m4s': 'video/iso.segment', '.mp4': 'video/mp4', '.vtt': 'text/vtt'}
+
+
+class OriginConfig:
+    """
+    Stream shape and fault injection settings of the test server
+    Rates are probabilities per media response; bandwidth is bytes per second
+    per connection (0 = unlimited)
+    """
+
+    def __init__(self, bandwidth=0, latency=0.0, jitter=0.0, error_rate=0.0, html_error_rate=0.0,
+                 stall_rate=0.0, stall_seconds=5.0, segment_duration=2.0, vod_segments=30,
+                 live_window=6, part_duration=0.5, seed=None):
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.html_error_rate = html_error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.segment_duration = segment_duration
+        self.vod_segments = vod_segments
+        self.live_window = live_window
+        self.part_duration = part_duration
+        self.seed = seed
+
+
+def ts_payload(size, seed):
+    """
+    Deterministic MPEG-TS bytes: whole 188-byte packets starting with 0x47
+    """
+    packets = max(1, size // TS_PACKET_SIZE)
+    packet = bytes([0x47, 0x01, 0x00, 0x10]) + bytes([seed % 256]) * (TS_PACKET_SIZE - 4)
+    return packet * packets
+
+
+def mp4_box(box_type, payload):
+    return struct.pack('>I', 8 + len(payload)) + box_type + payload
+
+
+class HLSTestServer:
+    """
+    Threaded synthetic HLS origin; start() binds to an ephemeral port by default
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, config=None):
+        self.host = host
+        self.port = port
+        self.config = config or OriginConfig()
+        self.started_at = time.monotonic()
+        self.request_log = []  # dicts: path, status, bytes, seconds
+        self._log_lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        # Generated payloads by (kind, *args); per instance so a stopped server's
+        # payloads are freed with it and configs never share entries
+        self._payloads = {}
+        self._payload_lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    def start(self):
+        handler = type('BoundHLSHandler', (HLSRequestHandler,), {'origin': self})
+        self._httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def random(self):
+        with self._rng_lock:
+            return self._rng.random()
+
+    def log_request(self, path, status, size, seconds):
+        with self._log_lock:
+            self.request_log.append({'path': path, 'status': status, 'bytes': size, 'seconds': seconds})
+
+    def reset_log(self):
+        with self._log_lock:
+            self.request_log = []
+
+    # Live clock -----------------------------------------------------------
+
+    @property
+    def parts_per_segment(self):
+        return max(1, int(round(self.config.segment_duration / self.config.part_duration)))
+
+    def published_parts(self):
+        """
+        Number of live parts published since the server started
+        """
+        return int((time.monotonic() - self.started_at) / self.config.part_duration)
+
+    def wait_for_parts(self, count, timeout):
+        deadline = time.monotonic() + timeout
+        while self.published_parts() < count and time.monotonic() < deadline:
+            time.sleep(min(0.01, self.config.part_duration / 10))
+        return self.published_parts() >= count
+
+    # Media ----------------------------------------------------------------
+
+    def segment_size(self, bitrate, duration):
+        return int(bitrate * duration / 8)
+
+    def _payload(self, key, build):
+        """
+        Return the cached payload for key, building it on first use
+        The oldest entry is dropped once PAYLOAD_CACHE_SIZE is reached
+        """
+        with self._payload_lock:
+            data = self._payloads.get(key)
+        if data is None:
+            data = build()
+            with self._payload_lock:
+                if len(self._payloads) >= PAYLOAD_CACHE_SIZE:
+                    del self._payloads[next(iter(self._payloads))]
+                self._payloads[key] = data
+        return data
+
+    def vod_segment(self, variant, index):
+        bitrate = dict((name, rate) for name, _, rate in VOD_VARIANTS)[variant]
+        return self._payload(('vod', variant, index), lambda: ts_payload(
+            self.segment_size(bitrate, self.config.segment_duration), index))
+
+    def live_part(self, msn, part):
+        return self._payload(('part', msn, part), lambda: ts_payload(
+            self.segment_size(STREAM_BITRATE, self.config.part_duration), msn * 31 + part))
+
+    def live_segment(self, msn):
+        return b''.join(self.live_part(msn, part) for part in range(self.parts_per_segment))
+
+    def byterange_file(self):
+        return self._payload(('byterange',), lambda: b''.join(
+            ts_payload(self.segment_size(STREAM_BITRATE, self.config.segment_duration), index)
+            for index in range(self.config.vod_segments)))
+
+    def fmp4_init(self):
+        return self._payload(('init',), self._build_fmp4_init)
+
+    def _build_fmp4_init(self):
+        ftyp = mp4_box(b'ftyp', b'iso6' + struct.pack('>I', 0) + b'iso6cmfc')
+        moov = mp4_box(b'moov', mp4_box(b'mvhd', bytes(100)) + mp4_box(b'trak', bytes(64)))
+        return ftyp + moov
+
+    def fmp4_segment(self, index):
+        return self._payload(('fmp4', index), lambda: self._build_fmp4_segment(index))
+
+    def _build_fmp4_segment(self, index):
+        size = self.segment_size(STREAM_BITRATE, self.config.segment_duration)
+        styp = mp4_box(b'styp', b'msdh' + struct.pack('>I', 0) + b'msdhmsix')
+        moof = mp4_box(b'moof', mp4_box(b'mfhd', struct.pack('>II', 0, index + 1)) + mp4_box(b'traf', bytes(40)))
+        mdat = mp4_box(b'mdat', bytes([index % 256]) * size)
+        return styp + moof + mdat
+
+    def webvtt_segment(self, index):
+        start = index * self.config.segment_duration
+        return (f"WEBVTT\nX-TIMESTAMP-MAP=MPEGTS:900000,LOCAL:00:00:00.000\n\n"
+                f"{self._vtt_time(start)} --> {self._vtt_time(start + self.config.segment_duration)}\n"
+                f"Subtitle {index}\n").encode('utf-8')
+
+    def _vtt_time(self, seconds):
+        minutes, seconds = divmod(seconds, 60)
+        return f"{int(minutes // 60):02d}:{int(minutes % 60):02d}:{seconds:06.3f}"
+
+    def encrypted_segment(self, index):
+        if Cipher is None:
+            return None
+        data = ts_payload(self.segment_size(STREAM_BITRATE, self.config.segment_duration), index)
+        padder = padding.PKCS7(128).padder()
+        padded = padder.update(data) + padder.finalize()
+        # No IV attribute: the IV is the media sequence number
+        encryptor = Cipher(algorithms.AES(ENCRYPTION_KEY), modes.CBC(index.to_bytes(16, 'big'))).encryptor()
+        return encryptor.update(padded) + encryptor.finalize()
+
+    # Playlists ------------------------------------------------------------
+
+    def vod_master(self):
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+        for name, resolution, bitrate in VOD_VARIANTS:
+            lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bitrate},RESOLUTION={resolution},CODECS="avc1.64001f,mp4a.40.2"')
+            lines.append(f'{name}/index.m3u8')
+        return lines
+
+    def alt_master(self):
+        lines = ['#EXTM3U', '#EXT-X-VERSION:4']
+        for group, language, name in ALT_AUDIO:
+            default = 'YES' if language == 'en' else 'NO'
+            lines.append(f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="{group}",NAME="{name}",LANGUAGE="{language}",'
+                         f'DEFAULT={default},AUTOSELECT=YES,URI="audio_{language}/index.m3u8"')
+        lines.append('#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="subs",NAME="English",LANGUAGE="en",'
+                     'DEFAULT=YES,AUTOSELECT=YES,URI="subs_en/index.m3u8"')
+        name, resolution, bitrate = VOD_VARIANTS[-1]
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bitrate + AUDIO_BITRATE},RESOLUTION={resolution},'
+                     f'CODECS="avc1.64001f,mp4a.40.2",AUDIO="aud",SUBTITLES="subs"')
+        lines.append('video/index.m3u8')
+        return lines
+
+    def vod_media(self, segment_name, extra_header=(), extra_per_segment=None):
+        duration = self.config.segment_duration
+        lines = ['#EXTM3U', '#EXT-X-VERSION:7', f'#EXT-X-TARGETDURATION:{int(duration + 0.999)}',
+                 '#EXT-X-MEDIA-SEQUENCE:0', '#EXT-X-PLAYLIST-TYPE:VOD', *extra_header]
+        for index in range(self.config.vod_segments):
+            if extra_per_segment:
+                lines.extend(extra_per_segment(index))
+            lines.append(f'#EXTINF:{duration:.3f},')
+            lines.append(segment_name.format(index=index))
+        lines.append('#EXT-X-ENDLIST')
+        return lines
+
+    def byterange_media(self):
+        size = self.segment_size(STREAM_BITRATE, self.config.segment_duration)
+        size -= size % TS_PACKET_SIZE
+        return self.vod_media('all.ts', extra_per_segment=lambda index: [f'#EXT-X-BYTERANGE:{size}@{index * size}'])
+
+    def live_media(self, low_latency, blocking_msn=None, blocking_part=None):
+        config = self.config
+        per_segment = self.parts_per_segment
+        target = int(config.segment_duration + 0.999)
+
+        if blocking_msn is not None:
+            wanted = blocking_msn * per_segment + (blocking_part + 1 if blocking_part is not None else per_segment)
+            # Servers hold blocking reloads for at most three target durations
+            self.wait_for_parts(wanted, 3 * target)
+
+        published = self.published_parts()
+        complete, current_parts = divmod(published, per_segment)
+        first = max(0, complete - config.live_window)
+
+        lines = ['#EXTM3U', '#EXT-X-VERSION:9' if low_latency else '#EXT-X-VERSION:3',
+                 f'#EXT-X-TARGETDURATION:{target}']
+        if low_latency:
+            lines.append(f'#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK={3 * config.part_duration:.3f}')
+            lines.append(f'#EXT-X-PART-INF:PART-TARGET={config.part_duration:.3f}')
+        lines.append(f'#EXT-X-MEDIA-SEQUENCE:{first}')
+
+        for msn in range(first, complete):
+            if low_latency and msn >= complete - 2:
+                lines.extend(self._part_lines(msn, per_segment))
+            lines.append(f'#EXTINF:{config.segment_duration:.3f},')
+            lines.append(f'seg_{msn}.ts')
+
+        if low_latency:
+            lines.extend(self._part_lines(complete, current_parts))
+            lines.append(f'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="part_{complete}_{current_parts}.ts"')
+        return lines
+
+    def _part_lines(self, msn, count):
+        return [f'#EXT-X-PART:DURATION={self.config.part_duration:.3f},URI="part_{msn}_{part}.ts"'
+                + (',INDEPENDENT=YES' if part == 0 else '')
+                for part in range(count)]
+
+    def route(self, path, query):
+        """
+        Map a request path to ('playlist', lines), ('media', bytes) or None
+        """
+        segment = re.fullmatch(r'/(\w+)/(?:(\w+)/)?([\w.]+)', path)
+        if not segment:
+            return None
+        stream, variant, name = segment.groups()
+        config = self.config
+
+        if stream == 'vod':
+            if name == 'master.m3u8' and not variant:
+                return 'playlist', self.vod_master()
+            if variant not in dict((v[0], v) for v in VOD_VARIANTS):
+                return None
+            if name == 'index.m3u8':
+                return 'playlist', self.vod_media('seg_{index}.ts')
+            match = re.fullmatch(r'seg_(\d+)\.ts', name)
+            if match and int(match.group(1)) < config.vod_segments:
+                return 'media', self.vod_segment(variant, int(match.group(1)))
+
+        elif stream == 'alt':
+            if name == 'master.m3u8' and not variant:
+                return 'playlist', self.alt_master()
+            renditions = ['video', 'subs_en'] + [f"audio_{language}" for _, language, _ in ALT_AUDIO]
+            if variant not in renditions:
+                return None
+            extension = 'vtt' if variant.startswith('subs') else 'ts'
+            if name == 'index.m3u8':
+                return 'playlist', self.vod_media(f'seg_{{index}}.{extension}')
+            match = re.fullmatch(rf'seg_(\d+)\.{extension}', name)
+            if match and int(match.group(1)) < config.vod_segments:
+                index = int(match.group(1))
+                if variant == 'video':
+                    return 'media', self.vod_segment(VOD_VARIANTS[-1][0], index)
+                if extension == 'vtt':
+                    return 'media', self.webvtt_segment(index)
+                return 'media', ts_payload(self.segment_size(AUDIO_BITRATE, config.segment_duration), index)
+
+        elif stream in ('live', 'llhls') and not variant:
+            low_latency = stream == 'llhls'
+            if name == 'index.m3u8':
+                msn = int(query['_HLS_msn'][0]) if low_latency and '_HLS_msn' in query else None
+                part = int(query['_HLS_part'][0]) if msn is not None and '_HLS_part' in query else None
+                return 'playlist', self.live_media(low_latency, msn, part)
+            match = re.fullmatch(r'seg_(\d+)\.ts', name)
+            if match:
+                msn = int(match.group(1))
+                if self.published_parts() >= (msn + 1) * self.parts_per_segment:
+                    return 'media', self.live_segment(msn)
+            match = re.fullmatch(r'part_(\d+)_(\d+)\.ts', name)
+            if low_latency and match:
+                msn, part = int(match.group(1)), int(match.group(2))
+                # Preload-hinted parts are held until they are published
+                if part < self.parts_per_segment and self.wait_for_parts(
+                        msn * self.parts_per_segment + part + 1, 3 * config.segment_duration):
+                    return 'media', self.live_part(msn, part)
+
+        elif stream == 'byterange' and not variant:
+            if name == 'index.m3u8':
+                return 'playlist', self.byterange_media()
+            if name == 'all.ts':
+                return 'media', self.byterange_file()
+
+        elif stream == 'fmp4' and not variant:
+            if name == 'index.m3u8':
+                return 'playlist', self.vod_media('seg_{index}.m4s', extra_header=['#EXT-X-MAP:URI="init.mp4"'])
+            if name == 'init.mp4':
+                return 'media', self.fmp4_init()
+            match = re.fullmatch(r'seg_(\d+)\.m4s', name)
+            if match and int(match.group(1)) < config.vod_segments:
+                return 'media', self.fmp4_segment(int(match.group(1)))
+
+        elif stream == 'encrypted' and not variant:
+            if name == 'index.m3u8':
+                return 'playlist', self.vod_media('seg_{index}.ts', extra_header=['#EXT-X-KEY:METHOD=AES-128,URI="key.bin"'])
+            if name == 'key.bin':
+                return 'media', ENCRYPTION_KEY
+            match = re.fullmatch(r'seg_(\d+)\.ts', name)
+            if match and int(match.group(1)) < config.vod_segments:
+                data = self.encrypted_segment(int(match.group(1)))
+                if data is None:
+                    return 'unavailable', "Encrypted streams need the 'cryptography' package"
+                return 'media', data
+
+        return None
+
+
+class HLSRequestHandler(BaseHTTPRequestHandler):
+    """
+    Request handler; `origin` is bound to an HLSTestServer by HLSTestServer.start()
+    """
+
+    origin = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def _handle(self, send_body):
+        started = time.monotonic()
+        parts = urlsplit(self.path)
+        config = self.origin.config
+
+        delay = config.latency + (self.origin.random() * 2 - 1) * config.jitter
+        if delay > 0:
+            time.sleep(delay)
+
+        routed = self.origin.route(parts.path, parse_qs(parts.query))
+        if routed is None:
+            self._send_simple(404, b'Not found', send_body)
+            self.origin.log_request(parts.path, 404, 0, time.monotonic() - started)
+            return
+
+        kind, payload = routed
+        if kind == 'unavailable':
+            self._send_simple(501, payload.encode('utf-8'), send_body)
+            self.origin.log_request(parts.path, 501, 0, time.monotonic() - started)
+            return
+        if kind == 'playlist':
+            body = ('\n'.join(payload) + '\n').encode('utf-8')
+            self._send_body(200, body, 'application/vnd.apple.mpegurl', send_body)
+            self.origin.log_request(parts.path, 200, len(body), time.monotonic() - started)
+            return
+
+        content_type = CONTENT_TYPES.get(parts.path[parts.path.rfind('.'):], 'application/octet-stream')
+        status, size = self._send_media(payload, content_type, send_body)
+        self.origin.log_request(parts.path, status, size, time.monotonic() - started)
+
+    def _send_media(self, data, content_type, send_body):
+        """
+        Send media bytes through fault injection; returns (status, bytes sent)
+        """
+        config = self.origin.config
+        roll = self.origin.random()
+
+        if roll < config.error_rate:
+            self._send_simple(503, b'Service Unavailable', send_body)
+            return 503, 0
+        roll -= config.error_rate
+
+        if roll < config.html_error_rate:
+            self._send_body(200, b'<!DOCTYPE html><html><body>Temporarily unavailable</body></html>',
+                            'text/html', send_body)
+            return 200, 0
+        roll -= config.html_error_rate
+
+        status = 200
+        content_range = None
+        range_match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if range_match:
+            start = int(range_match.group(1))
+            end = int(range_match.group(2)) if range_match.group(2) else len(data) - 1
+            end = min(end, len(data) - 1)
+            content_range = f"bytes {start}-{end}/{len(data)}"
+            data = data[start:end + 1]
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        if content_range:
+            self.send_header('Content-Range', content_range)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not send_body:
+            return status, 0
+
+        if roll < config.stall_rate:
+            # Send half the body, hang, then drop the connection
+            self._write_throttled(data[:len(data) // 2])
+            time.sleep(config.stall_seconds)
+            self.close_connection = True
+            return status, len(data) // 2
+
+        self._write_throttled(data)
+        return status, len(data)
+
+    def _write_throttled(self, data):
+        bandwidth = self.origin.config.bandwidth
+        if not bandwidth:
+            self.wfile.write(data)
+            return
+        chunk_size = max(1024, bandwidth // 20)
+        started = time.monotonic()
+        for offset in range(0, len(data), chunk_size):
+            self.wfile.write(data[offset:offset + chunk_size])
+            ahead = (offset + chunk_size) / bandwidth - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def _send_body(self, status, body, content_type, send_body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_simple(self, status, body, send_body):
+        self._send_body(status, body, 'text/plain', send_body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic HLS origin for load and fault-injection testing")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--bandwidth', type=int, default=0, help="Bytes per second per connection (0 = unlimited)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Added response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Random +/- latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of media responses that return 503")
+    parser.add_argument('--html-error-rate', type=float, default=0.0, help="Fraction served as HTML with 200")
+    parser.add_argument('--stall-rate', type=float, default=0.0, help="Fraction that stall and hang up")
+    parser.add_argument('--stall-seconds', type=float, default=5.0)
+    parser.add_argument('--segment-duration', type=float, default=2.0)
+    parser.add_argument('--vod-segments', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config = OriginConfig(args.bandwidth, args.latency, args.jitter, args.error_rate, args.html_error_rate,
+                          args.stall_rate, args.stall_seconds, args.segment_duration, args.vod_segments,
+                          seed=args.seed)
+    server = HLSTestServer(args.host, args.port, config).start()
+    print(f"🎯 HLSTestServer: Serving on {server.base_url} (vod, alt, live, llhls, byterange, fmp4, encrypted)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Load Test Scenarios
+Drive M3U8Processor and M3U8Downloader end to end against the synthetic origin
+
+Each scenario starts a local HLSTestServer (see hls_test_server.py) with its
+own fault profile, runs the real processing and download code against it and
+reports throughput and request latency percentiles. Everything runs offline.
+
+Usage:
+    python load_test.py                       # all scenarios
+    python load_test.py vod faults --jobs 16  # selected scenarios
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from hls_test_server import HLSTestServer, OriginConfig
+
+SCENARIOS = ['vod', 'faults', 'byterange', 'fmp4', 'renditions', 'live', 'llhls']
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ScenarioResult:
+    """
+    Outcome of one scenario: bytes moved, wall time and latency samples
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.ok = True
+        self.notes = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+        self.bytes = 0
+        self.ttfb = []       # Client-side time to response headers
+        self.service = []    # Server-side time to send each media response
+        self.errors = 0
+
+    def finish(self, server):
+        self.elapsed = time.monotonic() - self.started
+        media = [entry for entry in server.request_log if not entry['path'].endswith('.m3u8')]
+        self.service = [entry['seconds'] for entry in media]
+        self.errors = sum(1 for entry in media if entry['status'] >= 400)
+
+    def report(self):
+        throughput = self.bytes / self.elapsed / 1e6 if self.elapsed else 0.0
+        status = 'ok' if self.ok else 'FAILED'
+        print(f"{self.name:<10} {status:<7} {self.bytes / 1e6:8.2f} MB {self.elapsed:7.2f} s "
+              f"{throughput:8.2f} MB/s  ttfb p50/p95/p99 "
+              f"{percentile(self.ttfb, 0.5) * 1000:6.1f}/{percentile(self.ttfb, 0.95) * 1000:6.1f}/"
+              f"{percentile(self.ttfb, 0.99) * 1000:6.1f} ms  "
+              f"response p99 {percentile(self.service, 0.99) * 1000:7.1f} ms  "
+              f"server errors {self.errors}")
+        for note in self.notes:
+            print(f"{'':<10} {note}")
+
+
+def _track_ttfb(component, result):
+    """
+    Record time-to-headers of every request a processor/downloader makes
+    """
+    component.session.hooks['response'].append(
+        lambda response, *args, **kwargs: result.ttfb.append(response.elapsed.total_seconds()))
+
+
+def _sum_files(paths):
+    return sum(os.path.getsize(path) for path in paths if path and os.path.exists(path))
+
+
+def run_vod(server, args, work_dir, name='vod'):
+    """
+    Master playlist -> concurrent variant inspection -> N parallel jobs
+    downloading variants through one shared scheduler
+    """
+    from m3u8_processor import M3U8Processor
+    from downloader import M3U8Downloader
+    from download_scheduler import DownloadScheduler
+
+    result = ScenarioResult(name)
+    processor = M3U8Processor()
+    _track_ttfb(processor, result)
+
+    master = processor.process_playlist(server.url('vod/master.m3u8'))
+    inspected = processor.inspect_variants(master, sample_segments=2)
+    variants = [variant for variant in inspected['variants'] if 'segments' in variant]
+    result.notes.append(f"{len(variants)} variants inspected, "
+                        f"{sum(variant['segment_count'] for variant in variants)} segments total")
+
+    scheduler = DownloadScheduler(max_connections=args.connections, per_host_connections=args.connections)
+    outputs = [None] * args.jobs
+
+    def job(index):
+        downloader = M3U8Downloader(max_retries=args.retries)
+        _track_ttfb(downloader, result)
+        variant = variants[index % len(variants)]
+        outputs[index] = downloader.download_segments(
+            variant['segments'], os.path.join(work_dir, f"{name}_{index}"),
+            scheduler=scheduler, job_id=f"{name}-{index}")
+
+    threads = [threading.Thread(target=job, args=(index,)) for index in range(args.jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    scheduler.shutdown()
+
+    failed = sum(1 for files in outputs if files is None)
+    result.ok = failed == 0
+    if failed:
+        result.notes.append(f"{failed} of {args.jobs} jobs failed")
+    result.bytes = sum(_sum_files(files) for files in outputs if files)
+    return result
+
+
+def run_byterange(server, args, work_dir):
+    from m3u8_processor import M3U8Processor
+    from downloader import M3U8Downloader
+
+    result = ScenarioResult('byterange')
+    processor = M3U8Processor()
+    downloader = M3U8Downloader(max_workers=args.connections, max_retries=args.retries)
+    _track_ttfb(downloader, result)
+
+    playlist = processor.process_playlist(server.url('byterange/index.m3u8'))
+    files = downloader.download_segments(playlist['segments'], os.path.join(work_dir, 'byterange'))
+    result.ok = files is not None
+    result.bytes = _sum_files(files or [])
+    return result
+
+
+def run_fmp4(server, args, work_dir):
+    from downloader import M3U8Downloader
+
+    result = ScenarioResult('fmp4')
+    downloader = M3U8Downloader(max_workers=args.connections, max_retries=args.retries)
+    _track_ttfb(downloader, result)
+
+    outputs = downloader.download_stream({'url': server.url('fmp4/index.m3u8')},
+                                         os.path.join(work_dir, 'fmp4.mp4'))
+    result.ok = outputs is not None
+    result.bytes = _sum_files(outputs or [])
+    return result
+
+
+def run_renditions(server, args, work_dir):
+    """
+    Video, audio and subtitle renditions downloaded in parallel on one shared
+    scheduler and muxed; without ffmpeg the mux step is skipped
+    """
+    from downloader import M3U8Downloader
+    from download_scheduler import DownloadScheduler
+
+    result = ScenarioResult('renditions')
+    downloader = M3U8Downloader(max_workers=args.connections, max_retries=args.retries)
+    _track_ttfb(downloader, result)
+
+    if shutil.which('ffmpeg') is not None:
+        outputs = downloader.download_stream({'url': server.url('alt/master.m3u8')},
+                                             os.path.join(work_dir, 'renditions.mkv'))
+        result.ok = outputs is not None
+    else:
+        master = downloader.processor.process_playlist(server.url('alt/master.m3u8'))
+        variant = downloader.select_variant(master)
+        renditions = downloader.select_renditions(master, variant)
+        scheduler = DownloadScheduler(max_connections=args.connections, per_host_connections=args.connections)
+        try:
+            tracks = downloader.fetch_renditions(variant, renditions, os.path.join(work_dir, 'renditions'),
+                                                 scheduler=scheduler, job_id='renditions')
+        finally:
+            scheduler.shutdown()
+        result.ok = tracks is not None
+        result.notes.append(f"ffmpeg not found: {1 + len(renditions)} renditions downloaded, mux skipped")
+    result.bytes = sum(entry['bytes'] for entry in server.request_log)
+    return result
+
+
+def run_live(server, args, work_dir, low_latency=False):
+    """
+    Capture --live-seconds of a live stream and report how long it took
+    """
+    from downloader import M3U8Downloader
+
+    name = 'llhls' if low_latency else 'live'
+    # Let the live window fill up before joining
+    time.sleep(server.config.segment_duration * 2)
+
+    result = ScenarioResult(name)
+    downloader = M3U8Downloader(max_retries=args.retries)
+    _track_ttfb(downloader, result)
+
+    output_path = os.path.join(work_dir, f"{name}.ts")
+    path = f"{name}/index.m3u8"
+    outcome = downloader.download_live(server.url(path), output_path, max_duration=args.live_seconds)
+    result.ok = outcome is not None
+    result.bytes = _sum_files([output_path])
+    result.notes.append(f"captured {args.live_seconds:.0f}s of media in "
+                        f"{time.monotonic() - result.started:.2f}s wall time")
+    return result
+
+
+def run_scenario(name, args, work_dir):
+    faults = OriginConfig(
+        bandwidth=args.bandwidth, latency=args.latency, jitter=args.jitter, seed=args.seed,
+        segment_duration=args.segment_duration, vod_segments=args.vod_segments)
+    if name == 'faults':
+        faults.error_rate = args.error_rate
+        faults.html_error_rate = args.html_error_rate
+        faults.stall_rate = args.stall_rate
+        faults.stall_seconds = args.stall_seconds
+    if name in ('live', 'llhls'):
+        faults.segment_duration = 2.0
+
+    server = HLSTestServer(config=faults).start()
+    try:
+        if name in ('vod', 'faults'):
+            result = run_vod(server, args, work_dir, name)
+        elif name == 'byterange':
+            result = run_byterange(server, args, work_dir)
+        elif name == 'fmp4':
+            result = run_fmp4(server, args, work_dir)
+        elif name == 'renditions':
+            result = run_renditions(server, args, work_dir)
+        else:
+            result = run_live(server, args, work_dir, low_latency=name == 'llhls')
+        result.finish(server)
+        return result
+    finally:
+        server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load tests against the synthetic HLS origin")
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('--jobs', type=int, default=8, help="Parallel download jobs in the vod/faults scenarios")
+    parser.add_argument('--connections', type=int, default=8, help="Global connection budget")
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--bandwidth', type=int, default=0, help="Server bytes/s per connection (0 = unlimited)")
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.05, help="503 rate in the faults scenario")
+    parser.add_argument('--html-error-rate', type=float, default=0.02, help="HTML-with-200 rate in the faults scenario")
+    parser.add_argument('--stall-rate', type=float, default=0.02, help="Stall rate in the faults scenario")
+    parser.add_argument('--stall-seconds', type=float, default=1.0)
+    parser.add_argument('--segment-duration', type=float, default=2.0)
+    parser.add_argument('--vod-segments', type=int, default=30)
+    parser.add_argument('--live-seconds', type=float, default=6.0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    work_dir = tempfile.mkdtemp(prefix='m3u8-load-')
+    results = []
+    try:
+        for name in args.scenarios or SCENARIOS:
+            print(f"🔍 LoadTest: Running {name}...", file=sys.stderr)
+            results.append(run_scenario(name, args, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print()
+    for result in results:
+        result.report()
+    return 0 if all(result.ok for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
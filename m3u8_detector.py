@@ -3,12 +3,36 @@ M3U8 Detection Engine
 Handles network request interception and M3U8 URL detection
 """
 
-from PySide6.QtWebEngineCore import QWebEngineUrlRequestInterceptor, QWebEnginePage
+from PySide6.QtWebEngineCore import QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo, QWebEnginePage
 from PySide6.QtCore import QObject, Signal, QUrl
 from PySide6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
 from urllib.parse import urlparse, parse_qs
 import requests
-from threading import Thread
+from threading import Thread, Lock
+from probe_filter import NegativeProbeFilter
+from site_rules import default_rules
+
+ResourceType = QWebEngineUrlRequestInfo.ResourceType
+
+# Resource types that can never carry an M3U8 playlist
+NON_PLAYLIST_RESOURCE_TYPES = {
+    ResourceType.ResourceTypeMainFrame,
+    ResourceType.ResourceTypeSubFrame,
+    ResourceType.ResourceTypeStylesheet,
+    ResourceType.ResourceTypeScript,
+    ResourceType.ResourceTypeImage,
+    ResourceType.ResourceTypeFontResource,
+    ResourceType.ResourceTypeFavicon,
+    ResourceType.ResourceTypePing,
+    ResourceType.ResourceTypeCspReport,
+    ResourceType.ResourceTypeWorker,
+    ResourceType.ResourceTypeSharedWorker,
+    ResourceType.ResourceTypeServiceWorker,
+    ResourceType.ResourceTypeWebSocket,
+}
+
+# Skip common non-video file types
+SKIP_EXTENSIONS = ['.js', '.css', '.html', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.woff', '.ttf']
 
 class M3U8Detector(QWebEngineUrlRequestInterceptor):
     """
@@ -19,8 +43,9 @@ class M3U8Detector(QWebEngineUrlRequestInterceptor):
     # Signal emitted when M3U8 stream is detected
     m3u8_detected = Signal(dict)  # Emits stream info dict
     
-    def __init__(self):
+    def __init__(self, site_rules=None):
         super().__init__()
+        self.site_rules = site_rules or default_rules()
         
         # M3U8 content types to detect (will be used in Step 3)
         self.m3u8_content_types = [
@@ -35,6 +60,13 @@ class M3U8Detector(QWebEngineUrlRequestInterceptor):
         # Keep track of detected URLs to avoid duplicates
         self.detected_urls = set()
         
+        # Learns origins that never serve playlists; kept across page loads
+        self.negative_filter = NegativeProbeFilter()
+        
+        # Per-page counters of Content-Type probes made and avoided
+        self._stats_lock = Lock()
+        self.probe_stats = self._new_probe_stats()
+        
     def interceptRequest(self, info):
         """
         Intercept network requests to detect M3U8 streams
@@ -63,12 +95,45 @@ class M3U8Detector(QWebEngineUrlRequestInterceptor):
             # Only emit if we haven't seen this URL before
             if url not in self.detected_urls:
                 self.detected_urls.add(url)
+                self.negative_filter.record_positive(url)
                 print(f"🔍 M3U8Detector: Found M3U8 URL via pattern: {url}")
                 self.m3u8_detected.emit(stream_info)
-        else:
+        elif self.should_probe(info, url):
             # Step 3: Check Content-Type headers for URLs that don't match pattern
             # Do this in a background thread to avoid blocking
             Thread(target=self._check_content_type_async, args=(url,), daemon=True).start()
+            
+    def should_probe(self, info, url):
+        """
+        Decide whether a non-matching request is worth a Content-Type HEAD probe
+        Filters by site rule probe policy, resource type, file extension and
+        the learned per-origin negative filter, counting what each one avoids.
+        A site rule probe policy of 'always' overrides every filter
+        """
+        policy = self.site_rules.probe_policy(url)
+        
+        if policy == 'never':
+            reason = 'site_rule'
+        elif url in self.detected_urls:
+            reason = 'already_detected'
+        elif policy == 'always':
+            reason = None
+        elif info.resourceType() in NON_PLAYLIST_RESOURCE_TYPES:
+            reason = 'resource_type'
+        elif any(ext in url.lower() for ext in SKIP_EXTENSIONS):
+            reason = 'extension'
+        elif self.negative_filter.should_skip(url):
+            reason = 'negative_filter'
+        else:
+            reason = None
+            
+        with self._stats_lock:
+            self.probe_stats['requests'] += 1
+            if reason:
+                self.probe_stats['avoided'][reason] += 1
+            else:
+                self.probe_stats['probed'] += 1
+        return reason is None
         
     def detect_from_url(self, url):
         """
@@ -117,22 +182,18 @@ class M3U8Detector(QWebEngineUrlRequestInterceptor):
         Check Content-Type headers in background thread
         Step 3: Content-Type header detection implementation
         """
-        # Skip if already detected or if URL is clearly not video-related
+        # Skip if detected by another method while this probe was queued
         if url in self.detected_urls:
             return
             
-        # Skip common non-video file types
-        skip_extensions = ['.js', '.css', '.html', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.woff', '.ttf']
-        url_lower = url.lower()
-        if any(ext in url_lower for ext in skip_extensions):
-            return
-            
         try:
             # Make HEAD request to check Content-Type without downloading content
             response = requests.head(url, timeout=5, allow_redirects=True)
             content_type = response.headers.get('content-type', '').lower()
             
             if self.detect_from_headers({'content-type': content_type}):
+                self.negative_filter.record_positive(url)
+                
                 # Create stream info dict
                 stream_info = {
                     'url': url,
@@ -150,6 +211,8 @@ class M3U8Detector(QWebEngineUrlRequestInterceptor):
                     self.detected_urls.add(url)
                     print(f"🔍 M3U8Detector: Found M3U8 URL via Content-Type '{content_type}': {url}")
                     self.m3u8_detected.emit(stream_info)
+            else:
+                self.negative_filter.record_negative(url)
                     
         except Exception as e:
             # Silently ignore network errors to avoid spam
@@ -172,6 +235,35 @@ class M3U8Detector(QWebEngineUrlRequestInterceptor):
                 
         return False
         
+    def _new_probe_stats(self):
+        return {
+            'requests': 0,
+            'probed': 0,
+            'avoided': {
+                'site_rule': 0,
+                'resource_type': 0,
+                'already_detected': 0,
+                'extension': 0,
+                'negative_filter': 0,
+            },
+        }
+        
+    def report_probe_stats(self):
+        """
+        Print, return and reset the probe counters of the page being left
+        The GUI calls this whenever a page starts loading
+        """
+        with self._stats_lock:
+            stats = self.probe_stats
+            self.probe_stats = self._new_probe_stats()
+            
+        avoided = sum(stats['avoided'].values())
+        if stats['requests']:
+            details = ', '.join(f"{reason}={count}" for reason, count in stats['avoided'].items() if count)
+            print(f"🔍 M3U8Detector: {stats['probed']} HEAD probes, {avoided} avoided "
+                  f"of {stats['requests']} non-matching requests ({details or 'none'})")
+        return stats
+        
     def clear_detected_urls(self):
         """
         Clear the cache of detected URLs (useful when navigating to new page)
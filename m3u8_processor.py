@@ -3,10 +3,15 @@ M3U8 Playlist Processing Engine
 Handles M3U8 playlist parsing and processing
 """
 
+import mmap
+import os
 import requests
 import re
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
 from PySide6.QtCore import QObject, Signal
+from playlist_parser import PlaylistParser, parse_attribute_list
+from site_rules import default_rules
 
 class M3U8Processor(QObject):
     """
@@ -17,9 +22,11 @@ class M3U8Processor(QObject):
     # Signal for processing updates
     processing_finished = Signal(dict)  # Emits processed stream info
     processing_failed = Signal(str, str)  # Emits url, error_message
+    inspection_finished = Signal(dict)  # Emits master result with inspected variants
     
-    def __init__(self):
+    def __init__(self, site_rules=None):
         super().__init__()
+        self.site_rules = site_rules or default_rules()
         self.session = requests.Session()
         # Set a user agent to avoid blocking
         self.session.headers.update({
@@ -70,6 +77,119 @@ class M3U8Processor(QObject):
             self.processing_failed.emit(url, error_msg)
             return None
             
+    def process_playlist_streaming(self, url, page_url=None, page_title=None,
+                                   on_segment=None, keep_segments=True):
+        """
+        Streaming variant of process_playlist for very large playlists
+        The body is read line by line (HTTP iter_lines or a memory-mapped local
+        file) and fed to an incremental parser, so the full text is never held
+        in memory. on_segment(ParsedSegment) is called as each segment arrives,
+        letting callers schedule downloads before the playlist has finished.
+        With keep_segments=False no per-segment state is retained at all.
+        
+        Args:
+            url: M3U8 playlist URL or local file path
+            page_url: URL of the page where M3U8 was detected
+            page_title: Title of the page
+            on_segment: Optional callback invoked for every parsed segment
+            keep_segments: Collect segments into a SegmentTable for the result
+            
+        Returns:
+            Dictionary with processing results
+        """
+        try:
+            print(f"🔍 M3U8Processor: Streaming playlist from {url}")
+            
+            parser = PlaylistParser(url, self.resolve_url)
+            table = parser.new_table() if keep_segments else None
+            header_lines = []  # Lines before the first segment, in case this is a master
+            master_lines = None
+            
+            for line in self.open_playlist_lines(url):
+                if master_lines is not None:
+                    # Master playlists are small; buffer them for the variant parser
+                    master_lines.append(line)
+                    continue
+                    
+                segment = parser.feed(line)
+                if parser.is_valid is False:
+                    break
+                if header_lines is not None:
+                    header_lines.append(line)
+                if parser.is_master:
+                    master_lines = header_lines
+                elif segment:
+                    header_lines = None
+                    if table is not None:
+                        table.append(*segment)
+                    if on_segment:
+                        on_segment(segment)
+                        
+            if not parser.is_valid:
+                error_msg = "Content is not a valid M3U8 playlist"
+                print(f"❌ M3U8Processor: {error_msg}")
+                self.processing_failed.emit(url, error_msg)
+                return None
+                
+            if master_lines is not None:
+                result = self.process_master_playlist('\n'.join(master_lines), url, page_url, page_title)
+            else:
+                result = {
+                    'type': 'media_playlist',
+                    'url': url,
+                    'segment_count': parser.segment_count,
+                    'duration': table.total_duration if table is not None else None,
+                    'segments': table,
+                    'container': 'fmp4' if parser.init_map else 'ts',
+                    'target_duration': parser.target_duration,
+                    'page_url': page_url or '',
+                    'page_title': page_title or '',
+                    'is_live': self.detect_stream_type(self._stream_type_tags(parser), page_url),
+                    'quality': 'Unknown',
+                    'stream_type': 'direct'
+                }
+                
+            print(f"✅ M3U8Processor: Successfully streamed playlist from {url}")
+            self.processing_finished.emit(result)
+            return result
+            
+        except Exception as e:
+            error_msg = f"Failed to process M3U8 playlist: {str(e)}"
+            print(f"❌ M3U8Processor: {error_msg}")
+            self.processing_failed.emit(url, error_msg)
+            return None
+            
+    def open_playlist_lines(self, source):
+        """
+        Yield playlist lines without buffering the whole body
+        HTTP(S) URLs are streamed with iter_lines; local files are memory-mapped
+        """
+        if source.startswith(('http://', 'https://')):
+            with self.session.get(source, timeout=10, stream=True) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    yield line.decode('utf-8', errors='replace').rstrip('\r\n')
+            return
+            
+        path = source[len('file://'):] if source.startswith('file://') else source
+        if os.path.getsize(path) == 0:
+            return
+            
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line in iter(mapped.readline, b''):
+                yield line.decode('utf-8', errors='replace').rstrip('\r\n')
+                
+    def _stream_type_tags(self, parser):
+        """
+        Rebuild the tags detect_stream_type looks at from incremental parser state
+        """
+        tags = []
+        if parser.has_endlist:
+            tags.append('#EXT-X-ENDLIST')
+        if parser.playlist_type:
+            tags.append(f"#EXT-X-PLAYLIST-TYPE:{parser.playlist_type}")
+        return '\n'.join(tags)
+        
     def is_valid_m3u8(self, content):
         """
         Basic validation that content is a valid M3U8 playlist
@@ -94,13 +214,17 @@ class M3U8Processor(QObject):
         Based on Qooly's variant extraction logic
         """
         variants = []
+        renditions = []
         lines = content.split('\n')
         
         i = 0
         while i < len(lines):
             line = lines[i].strip()
             
-            if line.startswith('#EXT-X-STREAM-INF:'):
+            if line.startswith('#EXT-X-MEDIA:'):
+                renditions.append(self.parse_media(line, base_url))
+                
+            elif line.startswith('#EXT-X-STREAM-INF:'):
                 # Extract stream information
                 stream_info = self.parse_stream_inf(line)
                 
@@ -115,7 +239,10 @@ class M3U8Processor(QObject):
                             'url': full_url,
                             'quality': stream_info.get('resolution', ''),
                             'bandwidth': stream_info.get('bandwidth', ''),
+                            'average_bandwidth': stream_info.get('average_bandwidth', ''),
                             'codecs': stream_info.get('codecs', ''),
+                            'audio_group': stream_info.get('audio'),
+                            'subtitle_group': stream_info.get('subtitles'),
                             'is_master_playlist': False,  # These are media playlists
                             'page_url': page_url or '',
                             'page_title': page_title or '',
@@ -129,23 +256,128 @@ class M3U8Processor(QObject):
             'type': 'master_playlist',
             'url': base_url,
             'variants': variants,
+            'renditions': renditions,
             'page_url': page_url or '',
             'page_title': page_title or '',
             'is_live': self.detect_stream_type(content, page_url)
         }
         
+    def inspect_variants(self, master_result, sample_segments=0, max_workers=8):
+        """
+        Fetch every variant media playlist of a master playlist concurrently
+        and report exact duration, segment count and estimated size for each
+        
+        Sizes are estimated as AVERAGE-BANDWIDTH x duration, falling back to
+        the peak BANDWIDTH when the average isn't given. With sample_segments > 0,
+        that many segments per variant are also sized (from byte ranges or
+        HEAD Content-Length, all variants in parallel) and extrapolated to the
+        full duration as 'sampled_size'.
+        
+        Args:
+            master_result: Result of process_master_playlist
+            sample_segments: Segments per variant to size with HEAD requests
+            max_workers: Maximum concurrent requests
+            
+        Returns:
+            Copy of master_result with inspected variants
+        """
+        variants = master_result.get('variants', [])
+        workers = max(1, min(max_workers, len(variants)))
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            inspected = list(executor.map(self.inspect_variant, variants))
+            
+            if sample_segments:
+                # One batch of HEAD requests across all variants
+                samples = [(info, index) for info in inspected if 'segments' in info
+                           for index in self._sample_indexes(len(info['segments']), sample_segments)]
+                sizes = list(executor.map(lambda sample: self._segment_size(sample[0]['segments'][sample[1]]), samples))
+                for info in inspected:
+                    self._apply_sampled_size(info, [(index, size) for (sampled, index), size in zip(samples, sizes)
+                                                    if sampled is info])
+                    
+        result = dict(master_result, variants=inspected)
+        print(f"✅ M3U8Processor: Inspected {len(inspected)} variants of {master_result.get('url', '')}")
+        self.inspection_finished.emit(result)
+        return result
+        
+    def inspect_variant(self, variant):
+        """
+        Fetch one variant media playlist and compute its duration and size estimate
+        """
+        info = dict(variant)
+        try:
+            response = self.session.get(variant['url'], timeout=10)
+            response.raise_for_status()
+            segments = self.parse_segments(response.text, variant['url'])
+        except Exception as e:
+            info['error'] = str(e)
+            return info
+            
+        bandwidth = int(variant.get('average_bandwidth') or variant.get('bandwidth') or 0)
+        duration = segments.total_duration
+        info.update({
+            'segments': segments,
+            'segment_count': len(segments),
+            'duration': duration,
+            'is_live': self.detect_stream_type(response.text, variant.get('page_url')),
+            'estimated_size': int(bandwidth * duration / 8) if bandwidth else None,
+            'sampled_size': None
+        })
+        return info
+        
+    def _sample_indexes(self, count, samples):
+        """
+        Evenly spaced segment indexes to sample
+        """
+        if count <= samples:
+            return list(range(count))
+        step = count / samples
+        return [int(i * step + step / 2) for i in range(samples)]
+        
+    def _segment_size(self, segment):
+        """
+        Size of one segment in bytes from its byte range or a HEAD request
+        """
+        if segment.byte_range:
+            return segment.byte_range[1]
+        try:
+            response = self.session.head(segment.uri, timeout=10, allow_redirects=True)
+            response.raise_for_status()
+            return int(response.headers.get('content-length', 0)) or None
+        except Exception:
+            return None
+            
+    def _apply_sampled_size(self, info, sampled):
+        """
+        Extrapolate sampled segment sizes (bytes per media second) to the whole variant
+        """
+        segments = info.get('segments')
+        sampled = [(index, size) for index, size in sampled if size]
+        if not sampled or not segments:
+            return
+        sampled_bytes = sum(size for _, size in sampled)
+        sampled_seconds = sum(segments.durations[index] for index, _ in sampled)
+        if sampled_seconds > 0:
+            info['sampled_size'] = int(sampled_bytes / sampled_seconds * segments.total_duration)
+            
     def process_media_playlist(self, content, url, page_url=None, page_title=None):
         """
         Process media playlist (single stream)
         """
         # Extract basic information about the media playlist
-        segment_count = content.count('#EXTINF:')
+        parser = PlaylistParser(url, self.resolve_url)
+        segments = self.parse_segments(content, url, parser)
         is_live = self.detect_stream_type(content, page_url)
         
         return {
             'type': 'media_playlist',
             'url': url,
-            'segment_count': segment_count,
+            'segment_count': len(segments),
+            'duration': segments.total_duration,
+            'segments': segments,
+            'container': 'fmp4' if segments.is_fmp4 else 'ts',
+            'target_duration': parser.target_duration,
             'page_url': page_url or '',
             'page_title': page_title or '',
             'is_live': is_live,
@@ -153,17 +385,37 @@ class M3U8Processor(QObject):
             'stream_type': 'direct'
         }
         
+    def parse_segments(self, content, base_url, parser=None):
+        """
+        Parse media playlist segments into a columnar SegmentTable
+        URIs are resolved against base_url and share its directory as prefix;
+        pass a PlaylistParser to read playlist-level tags from it afterwards
+        """
+        parser = parser or PlaylistParser(base_url, self.resolve_url)
+        table = parser.new_table()
+        
+        for line in content.split('\n'):
+            segment = parser.feed(line)
+            if segment:
+                table.append(*segment)
+                
+        return table
+        
     def parse_stream_inf(self, stream_inf_line):
         """
         Parse EXT-X-STREAM-INF line to extract stream parameters
         """
         info = {}
         
-        # Extract bandwidth
-        bandwidth_match = re.search(r'BANDWIDTH=(\d+)', stream_inf_line)
+        # Extract bandwidth (peak) and average bandwidth
+        bandwidth_match = re.search(r'[:,]BANDWIDTH=(\d+)', stream_inf_line)
         if bandwidth_match:
             info['bandwidth'] = bandwidth_match.group(1)
             
+        average_match = re.search(r'AVERAGE-BANDWIDTH=(\d+)', stream_inf_line)
+        if average_match:
+            info['average_bandwidth'] = average_match.group(1)
+            
         # Extract resolution
         resolution_match = re.search(r'RESOLUTION=(\d+x\d+)', stream_inf_line)
         if resolution_match:
@@ -174,8 +426,35 @@ class M3U8Processor(QObject):
         if codecs_match:
             info['codecs'] = codecs_match.group(1)
             
+        # Extract alternate rendition groups (EXT-X-MEDIA GROUP-IDs)
+        audio_match = re.search(r'[:,]AUDIO="([^"]+)"', stream_inf_line)
+        if audio_match:
+            info['audio'] = audio_match.group(1)
+            
+        subtitles_match = re.search(r'[:,]SUBTITLES="([^"]+)"', stream_inf_line)
+        if subtitles_match:
+            info['subtitles'] = subtitles_match.group(1)
+            
         return info
         
+    def parse_media(self, media_line, base_url):
+        """
+        Parse an EXT-X-MEDIA line into an alternate rendition
+        'url' is None when the rendition is carried inside the variant streams
+        """
+        attributes = parse_attribute_list(media_line.split(':', 1)[1])
+        uri = attributes.get('URI')
+        return {
+            'type': attributes.get('TYPE', ''),
+            'group_id': attributes.get('GROUP-ID', ''),
+            'name': attributes.get('NAME', ''),
+            'language': attributes.get('LANGUAGE', ''),
+            'default': attributes.get('DEFAULT') == 'YES',
+            'autoselect': attributes.get('AUTOSELECT') == 'YES',
+            'channels': attributes.get('CHANNELS', ''),
+            'url': self.resolve_url(uri, base_url) if uri else None
+        }
+        
     def detect_stream_type(self, content, page_url):
         """
         Detect if M3U8 is live stream or VOD
@@ -193,20 +472,11 @@ class M3U8Processor(QObject):
         if "#EXT-X-PLAYLIST-TYPE:EVENT" in content:
             return True
             
-        # Domain-specific stream detection (from Qooly)
+        # Domain-specific stream detection (from Qooly), see site_rules.json
         if page_url:
-            live_patterns = [
-                r'play\.afreecatv\.com',
-                r'www\.mildom\.com',
-                r'tv\.kakao\.com',
-                r'tv\.naver\.com/l/',
-                r'chzzk\.naver\.com',
-                r'(www\.)?twitch\.tv'
-            ]
-            
-            for pattern in live_patterns:
-                if re.search(pattern, page_url):
-                    return True
+            site_live = self.site_rules.is_live(page_url)
+            if site_live is not None:
+                return site_live
                     
         # Default: assume live if no ENDLIST tag
         return "#EXT-X-ENDLIST" not in content
@@ -0,0 +1,245 @@
+"""
+Incremental Playlist Parser
+Line-at-a-time M3U8 parsing so playlists can be processed while they stream in
+"""
+
+import re
+from collections import namedtuple
+from datetime import datetime, timezone
+from segment_table import SegmentTable
+
+# One media segment as it is completed by the parser
+# init_map is the (uri, byte_offset, byte_length) of its #EXT-X-MAP, or None;
+# program_date the epoch seconds of its #EXT-X-PROGRAM-DATE-TIME, or None
+ParsedSegment = namedtuple(
+    'ParsedSegment',
+    ['uri', 'duration', 'sequence', 'byte_offset', 'byte_length', 'flags', 'init_map', 'program_date'],
+    defaults=(None, None)
+)
+
+# One LL-HLS partial segment (#EXT-X-PART) of media sequence number `sequence`
+PartialSegment = namedtuple(
+    'PartialSegment',
+    ['uri', 'duration', 'sequence', 'index', 'independent', 'byte_offset', 'byte_length', 'gap']
+)
+
+# KEY=VALUE pairs of an attribute list, VALUE optionally double-quoted
+ATTRIBUTE_PATTERN = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def parse_attribute_list(text):
+    """
+    Parse an HLS attribute list (e.g. 'BANDWIDTH=1280000,CODECS="avc1,mp4a"')
+    Quoted values are returned without their quotes
+    """
+    attributes = {}
+    for name, value in ATTRIBUTE_PATTERN.findall(text):
+        if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+            value = value[1:-1]
+        attributes[name] = value
+    return attributes
+
+
+def parse_program_date(text):
+    """
+    Parse an #EXT-X-PROGRAM-DATE-TIME value (ISO 8601) to epoch seconds
+    Values without a UTC offset are taken as UTC; invalid values return None
+    """
+    text = text.strip()
+    if text.endswith(('Z', 'z')):
+        text = text[:-1] + '+00:00'
+    try:
+        when = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
+
+
+class PlaylistParser:
+    """
+    Incremental parser for M3U8 playlists
+    Feed it one line at a time; completed media segments are returned from feed()
+    """
+
+    def __init__(self, base_url, resolve_url):
+        self.base_url = base_url
+        self.resolve_url = resolve_url
+
+        # Playlist-level state
+        self.is_valid = None  # Unknown until the first non-empty line
+        self.is_master = False
+        self.has_endlist = False
+        self.playlist_type = None
+        self.target_duration = None
+        self.segment_count = 0
+        self.init_map = None  # Current #EXT-X-MAP as (uri, byte_offset, byte_length)
+
+        # Low-Latency HLS state
+        self.server_control = {}
+        self.part_target = None
+        self.parts = []
+        self.preload_hint = None
+        self._part_index = 0
+
+        # Pending state for the next segment
+        self._sequence = 0
+        self._duration = None
+        self._flags = 0
+        self._encrypted = False
+        self._byte_length = -1
+        self._byte_offset = -1
+        self._program_date = None
+        self._next_offsets = {}  # uri -> end offset of its previous byte range
+
+    def feed(self, raw_line):
+        """
+        Parse one playlist line
+        Returns a ParsedSegment when the line completes a segment, otherwise None
+        """
+        line = raw_line.strip()
+        if not line:
+            return None
+
+        if self.is_valid is None:
+            # M3U8 files must start with #EXTM3U
+            self.is_valid = line == '#EXTM3U'
+            return None
+
+        if line.startswith('#'):
+            self._parse_tag(line)
+            return None
+
+        if self._duration is None:
+            # URI without #EXTINF (e.g. a variant in a master playlist)
+            return None
+
+        return self._complete_segment(line)
+
+    def _parse_tag(self, line):
+        if line.startswith('#EXTINF:'):
+            self._duration = float(line[len('#EXTINF:'):].split(',', 1)[0] or 0)
+        elif line.startswith('#EXT-X-BYTERANGE:'):
+            length, _, offset = line.split(':', 1)[1].partition('@')
+            self._byte_length = int(length)
+            self._byte_offset = int(offset) if offset else -1
+        elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            self._sequence = int(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-PROGRAM-DATE-TIME:'):
+            self._program_date = parse_program_date(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-TARGETDURATION:'):
+            self.target_duration = float(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-DISCONTINUITY') and not line.startswith('#EXT-X-DISCONTINUITY-'):
+            self._flags |= SegmentTable.FLAG_DISCONTINUITY
+        elif line == '#EXT-X-GAP':
+            self._flags |= SegmentTable.FLAG_GAP
+        elif line.startswith('#EXT-X-KEY:'):
+            self._encrypted = 'METHOD=NONE' not in line
+        elif line.startswith('#EXT-X-PLAYLIST-TYPE:'):
+            self.playlist_type = line.split(':', 1)[1].strip()
+        elif line == '#EXT-X-ENDLIST':
+            self.has_endlist = True
+        elif line.startswith('#EXT-X-STREAM-INF:'):
+            self.is_master = True
+        elif line.startswith('#EXT-X-MAP:'):
+            attributes = parse_attribute_list(line.split(':', 1)[1])
+            byte_offset, byte_length = -1, -1
+            if 'BYTERANGE' in attributes:
+                length, _, offset = attributes['BYTERANGE'].partition('@')
+                byte_length, byte_offset = int(length), int(offset or 0)
+            self.init_map = (self.resolve_url(attributes.get('URI', ''), self.base_url), byte_offset, byte_length)
+        elif line.startswith('#EXT-X-PART:'):
+            self._parse_part(parse_attribute_list(line.split(':', 1)[1]))
+        elif line.startswith('#EXT-X-PRELOAD-HINT:'):
+            hint = parse_attribute_list(line.split(':', 1)[1])
+            self.preload_hint = {
+                'type': hint.get('TYPE', 'PART'),
+                'uri': self.resolve_url(hint.get('URI', ''), self.base_url),
+                'sequence': self._sequence,
+                'index': self._part_index,
+                'byte_offset': int(hint.get('BYTERANGE-START', 0)),
+                'byte_length': int(hint['BYTERANGE-LENGTH']) if 'BYTERANGE-LENGTH' in hint else -1
+            }
+        elif line.startswith('#EXT-X-SERVER-CONTROL:'):
+            self.server_control = parse_attribute_list(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-PART-INF:'):
+            part_target = parse_attribute_list(line.split(':', 1)[1]).get('PART-TARGET')
+            self.part_target = float(part_target) if part_target else None
+
+    def _parse_part(self, attributes):
+        byte_offset, byte_length = -1, -1
+        if 'BYTERANGE' in attributes:
+            length, _, offset = attributes['BYTERANGE'].partition('@')
+            byte_length = int(length)
+            if offset:
+                byte_offset = int(offset)
+            elif self.parts and self.parts[-1].byte_length >= 0:
+                # Offset omitted: range continues from the previous part
+                byte_offset = self.parts[-1].byte_offset + self.parts[-1].byte_length
+            else:
+                byte_offset = 0
+
+        self.parts.append(PartialSegment(
+            self.resolve_url(attributes.get('URI', ''), self.base_url),
+            float(attributes.get('DURATION', 0)),
+            self._sequence,
+            self._part_index,
+            attributes.get('INDEPENDENT') == 'YES',
+            byte_offset,
+            byte_length,
+            attributes.get('GAP') == 'YES'
+        ))
+        self._part_index += 1
+
+    @property
+    def is_encrypted(self):
+        """
+        True while an #EXT-X-KEY other than METHOD=NONE is in effect
+        """
+        return self._encrypted
+
+    @property
+    def can_block_reload(self):
+        return self.server_control.get('CAN-BLOCK-RELOAD') == 'YES'
+
+    @property
+    def next_sequence(self):
+        """
+        Media sequence number of the next (possibly still in-progress) segment
+        """
+        return self._sequence
+
+    def _complete_segment(self, line):
+        uri = self.resolve_url(line, self.base_url)
+        byte_offset = self._byte_offset
+        if self._byte_length >= 0:
+            if byte_offset < 0:
+                # Offset omitted: range continues from the previous one
+                byte_offset = self._next_offsets.get(uri, 0)
+            self._next_offsets[uri] = byte_offset + self._byte_length
+
+        flags = self._flags
+        if self._encrypted:
+            flags |= SegmentTable.FLAG_ENCRYPTED
+
+        segment = ParsedSegment(uri, self._duration, self._sequence,
+                                byte_offset, self._byte_length, flags, self.init_map,
+                                self._program_date)
+
+        self.segment_count += 1
+        self._sequence += 1
+        self._part_index = 0
+        self._duration = None
+        self._flags = 0
+        self._byte_length = -1
+        self._byte_offset = -1
+        self._program_date = None
+        return segment
+
+    def new_table(self):
+        """
+        Create an empty SegmentTable sharing this playlist's directory as URI prefix
+        """
+        base_dir = '/'.join(self.base_url.split('/')[:-1])
+        return SegmentTable(uri_prefix=f"{base_dir}/" if base_dir else '')
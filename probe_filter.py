@@ -0,0 +1,79 @@
+"""
+Probe Filter
+Learns which origins never serve M3U8 playlists so they stop getting HEAD probes
+
+A counting filter (count-min style: a fixed bytearray of saturating counters
+addressed by several hashes) records negative Content-Type probes per host and
+per host + first path segment. Once a key has collected enough negatives it is
+skipped; a positive detection on the key clears its counts again. Memory is
+fixed (64 KiB by default) no matter how many origins a session visits.
+"""
+
+import hashlib
+import threading
+from urllib.parse import urlparse
+
+
+class NegativeProbeFilter:
+    """
+    Compact per-host / per-path-prefix negative filter for Content-Type probes
+    """
+
+    def __init__(self, size=1 << 16, hashes=4, path_threshold=3, host_threshold=12):
+        self.size = size
+        self.hashes = hashes
+        self.path_threshold = path_threshold
+        self.host_threshold = host_threshold
+        self._counters = bytearray(size)
+        self._lock = threading.Lock()
+
+    def _keys(self, url):
+        """
+        (host key, host + path prefix key) for a URL
+        """
+        parsed = urlparse(url)
+        host = parsed.netloc.lower()
+        prefix = parsed.path.lstrip('/').split('/', 1)[0]
+        return f"h:{host}", f"p:{host}/{prefix}"
+
+    def _slots(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4 * self.hashes).digest()
+        return [int.from_bytes(digest[i:i + 4], 'little') % self.size
+                for i in range(0, 4 * self.hashes, 4)]
+
+    def _estimate(self, key):
+        return min(self._counters[slot] for slot in self._slots(key))
+
+    def should_skip(self, url):
+        """
+        True when the URL's path prefix or its whole host has only ever probed negative
+        """
+        host_key, path_key = self._keys(url)
+        with self._lock:
+            return (self._estimate(path_key) >= self.path_threshold
+                    or self._estimate(host_key) >= self.host_threshold)
+
+    def record_negative(self, url):
+        """
+        Count a probe that did not find a playlist
+        """
+        with self._lock:
+            for key in self._keys(url):
+                for slot in self._slots(key):
+                    if self._counters[slot] < 255:
+                        self._counters[slot] += 1
+
+    def record_positive(self, url):
+        """
+        Forget the negatives of an origin that turned out to serve a playlist
+        """
+        with self._lock:
+            for key in self._keys(url):
+                slots = self._slots(key)
+                count = min(self._counters[slot] for slot in slots)
+                for slot in slots:
+                    self._counters[slot] -= count
+
+    def clear(self):
+        with self._lock:
+            self._counters = bytearray(self.size)
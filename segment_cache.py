@@ -0,0 +1,315 @@
+"""
+Segment Cache
+Shared on-disk cache for downloaded segments with content addressing and LRU eviction
+
+Layout under the cache directory:
+
+    objects/ab/abcdef...   segment bytes, named by their SHA-256
+    keys/12/123456...      canonical URI + byte range -> content hash
+    tmp/                   in-flight writes, moved into place with os.replace
+
+Objects are written before the key that points at them, and both land via an
+atomic rename, so a crash leaves at worst an unreferenced object that is
+evicted like any other. Identical content fetched under different URLs is
+stored once.
+
+Several processes may share one cache directory. Object modification times
+are the shared LRU clock (hits touch them), and the size cap is enforced
+against a periodic rescan of objects/ under an exclusive lock file, so it
+holds for the directory as a whole rather than per process. Keys whose
+objects were evicted are pruned during the same pass. Temporary files are
+only swept once they are old enough that no live writer can own them.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+from site_rules import default_rules
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'm3u8-downloader', 'segments')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+RESCAN_INTERVAL = 30.0         # Seconds between rescans of the shared directory
+STALE_TMP_SECONDS = 6 * 3600   # Temp files older than this belong to dead writers
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction passes are not serialized across processes
+    fcntl = None
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url):
+    """
+    Canonical form of a segment URL for cache keys
+    Lowercases scheme and host, drops default ports and the fragment
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
+
+class SegmentCache:
+    """
+    Disk-backed, size-capped segment cache safe to share between download jobs
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, site_rules=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.site_rules = site_rules or default_rules()  # Per-site URL canonicalization
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.keys_dir = os.path.join(cache_dir, 'keys')
+        self.tmp_dir = os.path.join(cache_dir, 'tmp')
+        for path in (self.objects_dir, self.keys_dir, self.tmp_dir):
+            os.makedirs(path, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()  # content hash -> size, least recently used first
+        self._total_bytes = 0
+        self._last_rescan = 0.0
+        self._lock_path = os.path.join(cache_dir, 'lock')
+        self._remove_stale_tmp()
+        self._rescan()
+
+    def _remove_stale_tmp(self):
+        """
+        Remove temporary files left behind by interrupted writes
+        Only old files are touched: other processes sharing the directory may
+        be writing the recent ones right now
+        """
+        cutoff = time.time() - STALE_TMP_SECONDS
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _rescan(self):
+        """
+        Rebuild the LRU order and total size from the objects on disk
+        Picks up objects stored, touched or evicted by other processes
+        """
+        entries = []
+        for shard in os.listdir(self.objects_dir):
+            shard_dir = os.path.join(self.objects_dir, shard)
+            try:
+                names = os.listdir(shard_dir)
+            except OSError:
+                continue
+            for digest in names:
+                try:
+                    stat = os.stat(os.path.join(shard_dir, digest))
+                except OSError:
+                    continue  # Evicted by another process mid-scan
+                entries.append((stat.st_mtime, digest, stat.st_size))
+
+        with self._lock:
+            self._lru = OrderedDict((digest, size) for _, digest, size in sorted(entries))
+            self._total_bytes = sum(size for _, _, size in entries)
+            self._last_rescan = time.monotonic()
+
+    def cache_key(self, url, byte_range=None):
+        """
+        Cache key for a segment: canonical URI plus byte range
+        Site rules can drop volatile query parameters (e.g. signed tokens)
+        """
+        key = self.site_rules.canonicalize(canonicalize_url(url))
+        if byte_range:
+            key += f"#{byte_range[0]}-{byte_range[1]}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _key_path(self, key):
+        return os.path.join(self.keys_dir, key[:2], key)
+
+    def get(self, url, byte_range=None):
+        """
+        Return the path of the cached segment, or None on a miss
+        """
+        key_path = self._key_path(self.cache_key(url, byte_range))
+        try:
+            with open(key_path, 'r') as f:
+                digest = f.read().strip()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        object_path = self._object_path(digest)
+        try:
+            os.utime(object_path)
+        except OSError:
+            # Object was evicted (possibly by another process); drop the stale key
+            try:
+                os.remove(key_path)
+            except OSError:
+                pass
+            with self._lock:
+                self.misses += 1
+                self._forget(digest)
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if digest in self._lru:
+                self._lru.move_to_end(digest)
+        return object_path
+
+    def store_stream(self, url, chunks, byte_range=None):
+        """
+        Write an iterable of byte chunks into the cache, hashing as it streams
+        Returns the path of the stored object
+        """
+        hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_path = self._temp_file()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    if chunk:
+                        hasher.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        digest = hasher.hexdigest()
+        object_path = self._object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(tmp_path, object_path)
+        self._write_key(self.cache_key(url, byte_range), digest)
+
+        with self._lock:
+            if digest in self._lru:
+                self._lru.move_to_end(digest)
+            else:
+                self._lru[digest] = size
+                self._total_bytes += size
+            needs_pass = (self._total_bytes > self.max_bytes
+                          or time.monotonic() - self._last_rescan > RESCAN_INTERVAL)
+        if needs_pass:
+            self._evict()
+        return object_path
+
+    def _temp_file(self):
+        """
+        New temporary file, named after this process so writers are traceable
+        """
+        return tempfile.mkstemp(dir=self.tmp_dir, prefix=f"{os.getpid()}-")
+
+    def put(self, url, data, byte_range=None):
+        """
+        Store a segment held in memory
+        """
+        return self.store_stream(url, [data], byte_range)
+
+    def _write_key(self, key, digest):
+        key_path = self._key_path(key)
+        os.makedirs(os.path.dirname(key_path), exist_ok=True)
+        fd, tmp_path = self._temp_file()
+        with os.fdopen(fd, 'w') as f:
+            f.write(digest)
+        os.replace(tmp_path, key_path)
+
+    def _forget(self, digest):
+        size = self._lru.pop(digest, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self):
+        """
+        Remove least recently used objects until the directory fits its size cap
+
+        Runs under an exclusive lock file so concurrent processes don't evict
+        the same budget twice, and starts from a fresh rescan so objects
+        written by other processes count against the cap. Keys left pointing
+        at evicted objects are pruned afterwards.
+        """
+        with open(self._lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._rescan()
+                evicted = False
+                with self._lock:
+                    while self._total_bytes > self.max_bytes and len(self._lru) > 1:
+                        digest, size = self._lru.popitem(last=False)
+                        self._total_bytes -= size
+                        evicted = True
+                        try:
+                            os.remove(self._object_path(digest))
+                        except OSError:
+                            pass
+                if evicted:
+                    self._prune_keys()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _prune_keys(self):
+        """
+        Remove keys whose object no longer exists
+        """
+        for shard in os.listdir(self.keys_dir):
+            shard_dir = os.path.join(self.keys_dir, shard)
+            try:
+                names = os.listdir(shard_dir)
+            except OSError:
+                continue
+            for key in names:
+                key_path = os.path.join(shard_dir, key)
+                try:
+                    with open(key_path, 'r') as f:
+                        digest = f.read().strip()
+                    if not os.path.exists(self._object_path(digest)):
+                        os.remove(key_path)
+                except OSError:
+                    pass
+
+    def copy_to(self, object_path, dest_path):
+        """
+        Materialize a cached object at dest_path
+        Uses a hard link when possible so cache hits cost no copy
+        """
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(object_path, dest_path)
+        except OSError:
+            shutil.copyfile(object_path, dest_path)
+        return dest_path
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def clear(self):
+        """
+        Remove every cached segment
+        """
+        with self._lock:
+            shutil.rmtree(self.objects_dir, ignore_errors=True)
+            shutil.rmtree(self.keys_dir, ignore_errors=True)
+            os.makedirs(self.objects_dir, exist_ok=True)
+            os.makedirs(self.keys_dir, exist_ok=True)
+            self._lru.clear()
+            self._total_bytes = 0
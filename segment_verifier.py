@@ -0,0 +1,145 @@
+"""
+Segment Verification
+Checks segment bytes as they stream in, so bad segments are re-fetched at once
+
+The checks run on each chunk as it arrives from the network:
+- HTML/JSON error bodies served with 200 are rejected on the first chunk
+- MPEG-TS: every 188th byte must be the 0x47 sync byte, and the total length
+  must be a whole number of packets
+- fMP4/CMAF: box headers must chain exactly from one box to the next
+- the byte count must match Content-Length (short reads)
+- an optional checksum ('sha256:<hex>') must match
+
+Callers that know the container from the playlist pass it in, so a segment
+whose first packet is corrupt cannot slip through as 'other'. The container
+is only sniffed from the first chunk when the playlist does not tell.
+"""
+
+import hashlib
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+
+# Box types that can start an fMP4/CMAF init or media segment
+FMP4_START_BOXES = {b'ftyp', b'styp', b'moof', b'moov', b'sidx', b'emsg', b'prft', b'free', b'skip'}
+
+
+class SegmentVerificationError(Exception):
+    """
+    Raised when a segment fails verification
+    """
+
+
+class SegmentVerifier:
+    """
+    Streaming verifier for one segment
+    Call feed() with each chunk and finish() after the last one
+    """
+
+    def __init__(self, expected_length=None, checksum=None, container=None):
+        self.expected_length = expected_length
+        self.container = container  # 'ts', 'fmp4' or 'other'; sniffed on the first chunk when None
+        self.position = 0
+
+        self._hasher = None
+        self._expected_digest = None
+        if checksum:
+            algorithm, _, digest = checksum.partition(':')
+            self._hasher = hashlib.new(algorithm)
+            self._expected_digest = digest.lower()
+
+        # fMP4 box walking state
+        self._header = b''         # Partial box header carried between chunks
+        self._box_remaining = 0    # Bytes left in the current box body
+        self._open_ended = False   # A box with size 0 runs to the end of the segment
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        if self.position == 0:
+            self._reject_error_page(chunk)
+        if self.container is None:
+            self.container = self._detect_container(chunk)
+
+        if self.container == 'ts':
+            self._check_ts(chunk)
+        elif self.container == 'fmp4':
+            self._check_boxes(chunk)
+
+        if self._hasher:
+            self._hasher.update(chunk)
+        self.position += len(chunk)
+
+    def finish(self):
+        """
+        Final checks once the whole segment has been fed
+        """
+        if self.expected_length is not None and self.position != self.expected_length:
+            raise SegmentVerificationError(
+                f"Short read: got {self.position} of {self.expected_length} bytes")
+        if self.position == 0:
+            raise SegmentVerificationError("Empty segment")
+        if self.container == 'ts' and self.position % TS_PACKET_SIZE:
+            raise SegmentVerificationError(
+                f"Truncated MPEG-TS: {self.position} bytes is not a whole number of packets")
+        if self.container == 'fmp4' and not self._open_ended and (self._header or self._box_remaining):
+            raise SegmentVerificationError("Truncated fMP4: last box is incomplete")
+        if self._hasher and self._hasher.hexdigest() != self._expected_digest:
+            raise SegmentVerificationError("Checksum mismatch")
+
+    def _reject_error_page(self, chunk):
+        head = chunk[:64].lstrip()
+        if head[:1] in (b'<', b'{'):
+            raise SegmentVerificationError("Got an HTML/JSON error page instead of media")
+
+    def _detect_container(self, chunk):
+        # One more sync byte in the next two packets rules out encrypted data
+        # that happens to start with 0x47, while still catching a bad packet 2
+        if chunk[0] == TS_SYNC_BYTE and (len(chunk) <= TS_PACKET_SIZE
+                                         or TS_SYNC_BYTE in chunk[TS_PACKET_SIZE:3 * TS_PACKET_SIZE:TS_PACKET_SIZE]):
+            return 'ts'
+        if chunk[4:8] in FMP4_START_BOXES:
+            return 'fmp4'
+        # Packed audio (ID3), WebVTT and anything else: length and checksum only
+        return 'other'
+
+    def _check_ts(self, chunk):
+        start = (-self.position) % TS_PACKET_SIZE
+        sync_bytes = chunk[start::TS_PACKET_SIZE]
+        if sync_bytes.count(TS_SYNC_BYTE) != len(sync_bytes):
+            raise SegmentVerificationError("MPEG-TS sync byte missing (corrupt or misaligned segment)")
+
+    def _check_boxes(self, chunk):
+        view = memoryview(chunk)
+        while len(view):
+            if self._open_ended:
+                return
+            if self._box_remaining:
+                step = min(self._box_remaining, len(view))
+                self._box_remaining -= step
+                view = view[step:]
+                continue
+
+            # Accumulate a box header (8 bytes, or 16 for 64-bit sizes)
+            needed = 16 if len(self._header) >= 8 and self._header[:4] == b'\x00\x00\x00\x01' else 8
+            take = min(needed - len(self._header), len(view))
+            self._header += bytes(view[:take])
+            view = view[take:]
+            if len(self._header) < needed:
+                return
+            if needed == 8 and self._header[:4] == b'\x00\x00\x00\x01':
+                continue  # 64-bit size follows
+
+            size = int.from_bytes(self._header[:4], 'big')
+            box_type = self._header[4:8]
+            if size == 1:
+                size = int.from_bytes(self._header[8:16], 'big')
+            if not all(32 <= byte < 127 for byte in box_type):
+                raise SegmentVerificationError(f"Invalid fMP4 box type {box_type!r}")
+            if size == 0:
+                self._open_ended = True
+            elif size < len(self._header):
+                raise SegmentVerificationError(f"Invalid fMP4 box size {size} for {box_type!r}")
+            else:
+                self._box_remaining = size - len(self._header)
+            self._header = b''
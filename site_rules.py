@@ -0,0 +1,169 @@
+"""
+Site Rule Engine
+Per-site stream heuristics loaded from a rules file and indexed by host suffix
+
+Rules live in a JSON file (site_rules.json by default):
+
+    {
+      "rules": [
+        {"domain": "twitch.tv", "live": true},
+        {"domain": "tv.naver.com", "path_prefix": "/l/", "live": true},
+        {"domain": "ads.example.com", "probe": "never"},
+        {"domain": "cdn.example.net", "canonicalize": {"drop_query_params": ["token", "expires"]}}
+      ]
+    }
+
+A rule for "example.com" also covers every subdomain of it. Rules are stored
+in a trie keyed by reversed host labels, so a lookup walks at most one node
+per label of the host regardless of how many rules are loaded. Each field
+(live, probe, canonicalize) is resolved on its own: the most specific matching
+domain (and then the longest path prefix) that sets it wins, so a narrow rule
+setting only "probe" keeps the "live" setting of a broader one.
+
+Rule fields:
+    domain        Host the rule applies to, including its subdomains
+    path_prefix   Only match URLs whose path starts with this
+    live          true/false to force live or VOD detection for pages on the site
+    probe         "always" or "never" to override Content-Type probe filtering
+    canonicalize  {"drop_query": true} or {"drop_query_params": [...]} for cache keys
+"""
+
+import json
+import os
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'site_rules.json')
+
+PROBE_POLICIES = ('always', 'never')
+
+
+class SiteRule:
+    """
+    One site rule
+    """
+
+    __slots__ = ('domain', 'path_prefix', 'live', 'probe', 'drop_query', 'drop_query_params')
+
+    def __init__(self, domain, path_prefix='', live=None, probe=None, canonicalize=None):
+        if probe is not None and probe not in PROBE_POLICIES:
+            raise ValueError(f"Invalid probe policy {probe!r} for {domain}")
+        canonicalize = canonicalize or {}
+        self.domain = domain.lower().strip('.')
+        self.path_prefix = path_prefix or ''
+        self.live = live
+        self.probe = probe
+        self.drop_query = bool(canonicalize.get('drop_query'))
+        self.drop_query_params = frozenset(canonicalize.get('drop_query_params', ()))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['domain'], data.get('path_prefix'), data.get('live'),
+                   data.get('probe'), data.get('canonicalize'))
+
+    def __repr__(self):
+        return f"SiteRule({self.domain}{self.path_prefix})"
+
+
+class _TrieNode:
+    __slots__ = ('children', 'rules')
+
+    def __init__(self):
+        self.children = {}
+        self.rules = []  # Rules for exactly this domain, longest path prefix first
+
+
+class SiteRuleEngine:
+    """
+    Host-suffix-indexed set of site rules
+    """
+
+    def __init__(self, rules=()):
+        self._root = _TrieNode()
+        self.rule_count = 0
+        for rule in rules:
+            self.add_rule(rule)
+
+    @classmethod
+    def load(cls, path=DEFAULT_RULES_PATH):
+        """
+        Load rules from a JSON rules file
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(SiteRule.from_dict(entry) for entry in data.get('rules', []))
+
+    def add_rule(self, rule):
+        node = self._root
+        for label in reversed(rule.domain.split('.')):
+            node = node.children.setdefault(label, _TrieNode())
+        node.rules.append(rule)
+        node.rules.sort(key=lambda existing: len(existing.path_prefix), reverse=True)
+        self.rule_count += 1
+
+    def match(self, url, sets_field=None):
+        """
+        Most specific rule for a URL, or None
+        With sets_field, only rules for which sets_field(rule) is true count
+        """
+        if not url:
+            return None
+        parts = urlsplit(url if '//' in url else f"//{url}")
+        host = (parts.hostname or '').rstrip('.')
+        path = parts.path or '/'
+
+        best = None
+        node = self._root
+        for label in reversed(host.split('.')):
+            node = node.children.get(label)
+            if node is None:
+                break
+            for rule in node.rules:
+                if path.startswith(rule.path_prefix) and (sets_field is None or sets_field(rule)):
+                    best = rule
+                    break
+        return best
+
+    def is_live(self, page_url):
+        """
+        True/False when a rule decides live detection for the page, else None
+        """
+        rule = self.match(page_url, lambda rule: rule.live is not None)
+        return rule.live if rule else None
+
+    def probe_policy(self, url):
+        """
+        'always', 'never' or None (use the default probe filtering)
+        """
+        rule = self.match(url, lambda rule: rule.probe is not None)
+        return rule.probe if rule else None
+
+    def canonicalize(self, url):
+        """
+        Apply the matching rule's query canonicalization to a URL
+        """
+        rule = self.match(url, lambda rule: rule.drop_query or rule.drop_query_params)
+        if rule is None:
+            return url
+        parts = urlsplit(url)
+        if rule.drop_query:
+            query = ''
+        else:
+            query = urlencode([(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                               if name not in rule.drop_query_params])
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, query, parts.fragment))
+
+
+_default_engine = None
+
+
+def default_rules():
+    """
+    Shared engine loaded from site_rules.json (empty if the file is missing)
+    """
+    global _default_engine
+    if _default_engine is None:
+        if os.path.exists(DEFAULT_RULES_PATH):
+            _default_engine = SiteRuleEngine.load(DEFAULT_RULES_PATH)
+        else:
+            _default_engine = SiteRuleEngine()
+    return _default_engine
@@ -4,6 +4,7 @@ Manages detected streams and coordinates between detection, processing, and down
 """
 
 from PySide6.QtCore import QObject, Signal
+from download_scheduler import DownloadScheduler, PRIORITY_LIVE, PRIORITY_VOD
 
 class StreamManager(QObject):
     """
@@ -15,9 +16,11 @@ class StreamManager(QObject):
     stream_added = Signal(dict)  # New stream detected
     stream_updated = Signal(dict)  # Stream info updated
     
-    def __init__(self):
+    def __init__(self, max_connections=16, per_host_connections=4):
         super().__init__()
         self.detected_streams = []
+        # Shared by every download so jobs compete for one connection budget
+        self.scheduler = DownloadScheduler(max_connections, per_host_connections)
         
     def add_detected_stream(self, stream_info):
         """
@@ -26,6 +29,32 @@ class StreamManager(QObject):
         """
         pass
         
+    def register_download(self, job_id, stream_info, weight=1.0):
+        """
+        Register a download job with the scheduler
+        Live streams get the live priority class so they beat VOD backfill
+        """
+        priority = PRIORITY_LIVE if stream_info.get('is_live') else PRIORITY_VOD
+        return self.scheduler.add_job(job_id, priority=priority, weight=weight)
+        
+    def pause_download(self, job_id=None):
+        """
+        Pause one download job, or all of them when job_id is None
+        """
+        if job_id is None:
+            self.scheduler.pause()
+        else:
+            self.scheduler.pause_job(job_id)
+            
+    def resume_download(self, job_id=None):
+        """
+        Resume one download job, or all of them when job_id is None
+        """
+        if job_id is None:
+            self.scheduler.resume()
+        else:
+            self.scheduler.resume_job(job_id)
+            
     def get_streams(self):
         """
         Get all detected streams